@@ -1,31 +1,117 @@
+import abc
+import asyncio
+import contextvars
 import csv
+import fnmatch
+import hashlib
+import importlib
 import io
+import itertools
 import json
 import logging
+import multiprocessing
 import os
 import queue
+import random
+import re
+import sqlite3
+import sys
+import threading
+import time
 import urllib.parse
-from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime
+import uuid
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    TimeoutError,
+    as_completed,
+    wait,
+)
+from datetime import datetime, timedelta
 from enum import Enum
 from functools import partial
 from queue import Queue
-from typing import Any, Dict, Generator, List, Optional, Tuple, TypeVar
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
 import click
-import gradio as gr
-import requests
+import httpx
+import numpy as np
+import openai
 from bs4 import BeautifulSoup
-from chonkie import Chunk
 from dotenv import load_dotenv
 from jinja2 import BaseLoader, Environment
 from openai import OpenAI
 from pydantic import BaseModel, create_model
 
+if TYPE_CHECKING:
+    import duckdb
+    from chonkie import Chunk, TokenChunker
+    from docling.document_converter import DocumentConverter
+
 TypeVar_BaseModel = TypeVar("TypeVar_BaseModel", bound=BaseModel)
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 default_env_file = os.path.abspath(os.path.join(script_dir, ".env"))
+default_cache_dir = os.path.abspath(os.path.join(script_dir, ".cache"))
+default_data_dir = os.path.abspath(os.path.join(script_dir, "data"))
+
+# the embedding models with this prefix run in the process
+local_embedding_prefix = "local:"
+
+# the chunk table used by the persistent corpus mode
+corpus_table_name = "corpus_chunks"
+# the chunk table of the local data folder
+local_table_name = "local_chunks"
+
+# the prompts are part of the answer cache key
+answer_system_prompt = (
+    "You are an expert summarizing the answers based on the provided contents."
+)
+answer_user_prompt_template = """
+Given the context as a sequence of references with a reference id in the 
+format of a leading [x], please answer the following question using {{ language }}:
+
+{{ query }}
+
+In the answer, use format [1], [2], ..., [n] in line where the reference is used. 
+For example, "According to the research from Google[3], ...".
+
+Please create the answer strictly related to the context. If the context has no
+information about the query, please write "No related information found in the context."
+using {{ language }}.
+
+{{ length_instructions }}
+
+Here is the context:
+{{ context }}
+"""
+extract_system_prompt = (
+    "You are an expert of extract structual information from the document."
+)
+extract_user_prompt_template = """
+Given the provided content, if it contains information about {{ query }}, please extract the
+list of structured data items as defined in the following Pydantic schema:
+
+{{ extract_schema_str }}
+
+Below is the provided content:
+{{ content }}
+"""
 
 
 class OutputMode(str, Enum):
@@ -38,6 +124,13 @@ class InputMode(str, Enum):
     local = "local"
 
 
+class PipelineMode(str, Enum):
+    # each stage finishes for all documents before the next stage starts
+    sequential = "sequential"
+    # each document is chunked and embedded as soon as it is fetched
+    async_ = "async"
+
+
 class AskSettings(BaseModel):
     date_restrict: int
     target_site: str
@@ -49,6 +142,9 @@ class AskSettings(BaseModel):
     input_mode: InputMode
     output_mode: OutputMode
     extract_schema_str: str
+    top_k: int
+    pipeline_mode: PipelineMode
+    query_variants: int
 
 
 def _get_logger(log_level: str) -> logging.Logger:
@@ -64,6 +160,36 @@ def _get_logger(log_level: str) -> logging.Logger:
     return logger
 
 
+# the log queue of the query running in the current context
+_query_log_queue: contextvars.ContextVar[Optional[Queue]] = contextvars.ContextVar(
+    "query_log_queue", default=None
+)
+
+
+class _QueryLogHandler(logging.Handler):
+    """
+    Put the log records into the log queue of the query of the current context.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.setFormatter(
+            logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+        )
+
+    def emit(self, record: logging.LogRecord) -> None:
+        log_queue = _query_log_queue.get()
+        if log_queue is not None:
+            log_queue.put(self.format(record))
+
+
+def _submit_in_context(
+    executor: ThreadPoolExecutor, fn: Callable[..., Any], *args, **kwargs
+) -> Future:
+    # run fn in a copy of the context of the caller
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
 def _read_url_list(url_list_file: str) -> List[str]:
     if not url_list_file:
         return []
@@ -87,6 +213,189 @@ def _read_extract_schema_str(extract_schema_file: str) -> str:
     return schema_str
 
 
+def _matches_any(rel_path: str, globs: List[str]) -> bool:
+    # a glob matches either the relative path or the name
+    name = rel_path.rsplit("/", 1)[-1]
+    return any(
+        fnmatch.fnmatch(rel_path, glob) or fnmatch.fnmatch(name, glob) for glob in globs
+    )
+
+
+def _list_data_files(
+    data_dir: str, include_globs: List[str], exclude_globs: List[str]
+) -> Generator[str, None, None]:
+    """
+    Yield the files in the data folder matching the include and exclude globs.
+    """
+    for root, dir_names, file_names in os.walk(data_dir):
+        rel_root = os.path.relpath(root, data_dir).replace(os.sep, "/")
+        rel_root = "" if rel_root == "." else f"{rel_root}/"
+        dir_names[:] = sorted(
+            dir_name
+            for dir_name in dir_names
+            if not _matches_any(f"{rel_root}{dir_name}", exclude_globs)
+        )
+        for file_name in sorted(file_names):
+            rel_path = f"{rel_root}{file_name}"
+            if len(include_globs) > 0 and not _matches_any(rel_path, include_globs):
+                continue
+            if _matches_any(rel_path, exclude_globs):
+                continue
+            yield os.path.join(root, file_name)
+
+
+def _batched(items: Iterable[Any], batch_size: int) -> Generator[List[Any], None, None]:
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if len(batch) == 0:
+            return
+        yield batch
+
+
+def _load_duckdb_extension(db_con: "duckdb.DuckDBPyConnection", name: str) -> None:
+    # an unread result keeps a transaction open, so fetch all the rows
+    installed = db_con.execute(
+        "SELECT installed FROM duckdb_extensions() WHERE extension_name = ?", [name]
+    ).fetchall()
+    if len(installed) == 0 or not installed[0][0]:
+        db_con.install_extension(name)
+    db_con.load_extension(name)
+
+
+def _content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _insert_chunk_batch(
+    db_con: "duckdb.DuckDBPyConnection",
+    table_name: str,
+    urls: List[str],
+    content_hashes: List[str],
+    texts: List[str],
+    embeddings: np.ndarray,
+) -> None:
+    """
+    Insert the chunks and their embeddings as one Arrow table.
+    """
+    import pyarrow as pa
+
+    if len(texts) == 0:
+        return
+
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    dimensions = embeddings.shape[1]
+    chunk_batch = pa.table(
+        {
+            "url": pa.array(urls, type=pa.string()),
+            "content_hash": pa.array(content_hashes, type=pa.string()),
+            "chunk": pa.array(texts, type=pa.string()),
+            "vec": pa.FixedSizeListArray.from_arrays(
+                pa.array(embeddings.reshape(-1)), dimensions
+            ),
+        }
+    )
+    # the registered name is only visible to this connection
+    db_con.register("chunk_batch", chunk_batch)
+    try:
+        db_con.execute(
+            f"""
+            INSERT INTO {table_name} (url, content_hash, chunk, vec)
+            SELECT url, content_hash, chunk, vec FROM chunk_batch
+            """
+        )
+    finally:
+        db_con.unregister("chunk_batch")
+
+
+def _merge_extracted_items(
+    items_list: List[List[TypeVar_BaseModel]],
+) -> List[TypeVar_BaseModel]:
+    """
+    Merge the items extracted from the parts of a document without duplicates.
+    """
+    merged: Dict[str, TypeVar_BaseModel] = {}
+    for items in items_list:
+        for item in items:
+            merged.setdefault(item.model_dump_json(), item)
+    return list(merged.values())
+
+
+_stop_words = frozenset(
+    (
+        "a an and are as at be by can could did do does for from how i in is it me my "
+        "of on or should tell the to was what when where which who why will with would "
+        "you your"
+    ).split()
+)
+
+
+# e.g., "what is ..."
+_question_pattern = re.compile(
+    r"^(?:what|who|which|where|when|why|how)\s+"
+    r"(is|are|was|were|do|does|did|can|could|should|would|will)\s+(.+?)[?\s]*$",
+    re.IGNORECASE,
+)
+
+
+def _heuristic_query_variants(query: str) -> List[str]:
+    # the keywords and the question rewritten as a statement
+    words = re.findall(r"[\w'-]+", query.lower())
+    keywords = " ".join([word for word in words if word not in _stop_words])
+    if keywords == "":
+        keywords = " ".join(words)
+    variants = [keywords]
+
+    match = _question_pattern.match(query.strip())
+    if match is not None:
+        verb, subject = match.group(1).lower(), match.group(2)
+        # "what is the capital of France?" -> "the capital of France is"
+        if verb in ("is", "are", "was", "were"):
+            variants.append(f"{subject} {verb}")
+        else:
+            variants.append(subject)
+    return variants
+
+
+def _interleave_links(link_lists: List[List[str]]) -> List[str]:
+    # take the links of all the queries rank by rank
+    links = itertools.chain(*itertools.zip_longest(*link_lists))
+    return list(dict.fromkeys(link for link in links if link is not None))
+
+
+def _fuse_rankings(
+    ranked_ids: List[np.ndarray],
+    ranked_scores: List[np.ndarray],
+    weights: List[float],
+    method: str,
+    rrf_k: int = 60,
+) -> np.ndarray:
+    """
+    Fuse the ranked lists of ids into one list of unique ids. With rrf an id scores
+    weight / (rrf_k + rank) in each list, with weighted the min-max normalized
+    score times the weight.
+    """
+    contributions = []
+    for ids, scores, weight in zip(ranked_ids, ranked_scores, weights):
+        if method == "rrf":
+            contributions.append(weight / (rrf_k + np.arange(1, len(ids) + 1)))
+        else:
+            span = scores.max() - scores.min() if len(scores) > 0 else 0.0
+            if span > 0:
+                contributions.append(weight * (scores - scores.min()) / span)
+            else:
+                contributions.append(np.full(len(scores), float(weight)))
+    if len(contributions) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    unique_ids, first_index, inverse = np.unique(
+        np.concatenate(ranked_ids), return_index=True, return_inverse=True
+    )
+    fused_scores = np.bincount(inverse, weights=np.concatenate(contributions))
+    # the ties are broken by the first appearance in the lists
+    return unique_ids[np.lexsort((first_index, -fused_scores))]
+
+
 def _output_csv(result_dict: Dict[str, List[BaseModel]], key_name: str) -> str:
     # generate the CSV content from a Dict of URL and list of extracted items
     output = io.StringIO()
@@ -108,27 +417,812 @@ def _output_csv(result_dict: Dict[str, List[BaseModel]], key_name: str) -> str:
     return csv_content
 
 
+class TextExtractor(abc.ABC):
+    """
+    Extract the readable text of the body from the raw HTML content of a page.
+    """
+
+    @abc.abstractmethod
+    def extract(self, content: bytes) -> Optional[str]:
+        """
+        Return the body text with the whitespaces collapsed, or None if the page
+        has no body.
+        """
+
+
+class BeautifulSoupTextExtractor(TextExtractor):
+    """
+    Build the full BeautifulSoup tree and get all the text in the body.
+    """
+
+    def extract(self, content: bytes) -> Optional[str]:
+        soup = BeautifulSoup(content, "lxml", from_encoding="utf-8")
+        body_tag = soup.body
+        if not body_tag:
+            return None
+        body_text = body_tag.get_text()
+        return " ".join(body_text.split()).strip()
+
+
+class _BodyTextCollector:
+    """
+    The lxml parser target that keeps the body text outside the boilerplate tags.
+    """
+
+    def __init__(
+        self,
+        skip_tags: Tuple[str, ...],
+        page_region_tags: Tuple[str, ...],
+        block_tags: Tuple[str, ...],
+    ):
+        self.skip_tags = skip_tags
+        self.page_region_tags = page_region_tags
+        self.block_tags = block_tags
+        self.in_body = False
+        self.depth = 0
+        self.body_depth = 0
+        # the depth of the element whose text is being skipped, if any
+        self.skip_start: Optional[int] = None
+        self.parts: List[str] = []
+
+    def start(self, tag: str, attrib: Dict[str, str]) -> None:
+        self.depth += 1
+        if tag == "body":
+            self.in_body = True
+            self.body_depth = self.depth
+        elif self.skip_start is not None:
+            return
+        elif tag in self.skip_tags or (
+            tag in self.page_region_tags
+            and self.in_body
+            and self.depth == self.body_depth + 1
+        ):
+            self.skip_start = self.depth
+        elif tag in self.block_tags:
+            self.parts.append(" ")
+
+    def end(self, tag: str) -> None:
+        if self.skip_start == self.depth:
+            self.skip_start = None
+        elif self.skip_start is None and tag in self.block_tags:
+            self.parts.append(" ")
+        self.depth -= 1
+
+    def data(self, data: str) -> None:
+        if self.in_body and self.skip_start is None:
+            self.parts.append(data)
+
+    def close(self) -> Optional[str]:
+        if not self.in_body:
+            return None
+        return " ".join("".join(self.parts).split()).strip()
+
+
+class LxmlTextExtractor(TextExtractor):
+    """
+    Stream the parser events of lxml into a text collector without building a tree,
+    and drop the text of the script, style and navigation boilerplate tags.
+    """
+
+    skip_tags = (
+        "script",
+        "style",
+        "noscript",
+        "template",
+        "svg",
+        "iframe",
+        "nav",
+        "footer",
+    )
+    # only skipped as direct children of the body
+    page_region_tags = (
+        "header",
+        "aside",
+    )
+    block_tags = (
+        "p",
+        "div",
+        "br",
+        "li",
+        "ul",
+        "ol",
+        "h1",
+        "h2",
+        "h3",
+        "h4",
+        "h5",
+        "h6",
+        "tr",
+        "td",
+        "th",
+        "table",
+        "section",
+        "article",
+        "main",
+        "blockquote",
+        "pre",
+        "dt",
+        "dd",
+    )
+
+    def extract(self, content: bytes) -> Optional[str]:
+        from lxml import etree
+
+        collector = _BodyTextCollector(
+            self.skip_tags, self.page_region_tags, self.block_tags
+        )
+        parser = etree.HTMLParser(target=collector, encoding="utf-8")
+        parser.feed(content)
+        return parser.close()
+
+
+# the available extractors for the HTML_TEXT_EXTRACTOR env variable
+text_extractors: Dict[str, type] = {
+    "lxml": LxmlTextExtractor,
+    "bs4": BeautifulSoupTextExtractor,
+}
+
+
+def _extract_page_text(
+    extractor_name: str, content: bytes
+) -> Tuple[Optional[str], float, str]:
+    """
+    Return the body text, the CPU seconds and the error message if the extractor
+    failed and BeautifulSoup was used instead. Runs in the parse worker processes.
+    """
+    start_time = time.process_time()
+    error = ""
+    extractor = text_extractors[extractor_name]()
+    try:
+        body_text = extractor.extract(content)
+    except Exception as e:
+        if isinstance(extractor, BeautifulSoupTextExtractor):
+            raise
+        error = str(e)
+        body_text = BeautifulSoupTextExtractor().extract(content)
+    return body_text, time.process_time() - start_time, error
+
+
+# the Docling converter of a conversion worker process
+_worker_converter = None
+
+
+def _convert_file_in_worker(file_path: str) -> Tuple[str, float]:
+    """
+    Return the markdown of a local file and the conversion seconds. Runs in the
+    conversion worker processes.
+    """
+    global _worker_converter
+    from docling.document_converter import DocumentConverter
+
+    start_time = time.perf_counter()
+    if _worker_converter is None:
+        _worker_converter = DocumentConverter()
+    result = _worker_converter.convert(file_path)
+    return result.document.export_to_markdown(), time.perf_counter() - start_time
+
+
+class AsyncHttpClient:
+    """
+    A connection-pooled HTTP client running on its own event loop thread, with a
+    global concurrency cap and per-host limits for the polite requests.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        per_host_concurrency: int,
+        politeness_delay: float,
+        http2: bool,
+        headers: Dict[str, str],
+        timeout: float,
+        logger: logging.Logger,
+    ):
+        self.max_concurrency = max_concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.politeness_delay = politeness_delay
+        self.logger = logger
+
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 requires the h2 package, falling back to HTTP/1.1.")
+                http2 = False
+
+        # the following state is only accessed on the event loop thread
+        self._global_semaphore = asyncio.Semaphore(max_concurrency)
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._host_next_time: Dict[str, float] = {}
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="AsyncHttpClient", daemon=True
+        )
+        self._thread.start()
+        self._client: httpx.AsyncClient = self._run(
+            self._create_client(headers, timeout, http2)
+        )
+
+    async def _create_client(
+        self, headers: Dict[str, str], timeout: float, http2: bool
+    ) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            headers=headers,
+            timeout=timeout,
+            http2=http2,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=self.max_concurrency,
+                max_keepalive_connections=self.max_concurrency,
+            ),
+        )
+
+    def _run(self, coro: Any) -> Any:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _wait_for_host(self, host: str) -> None:
+        # reserve the next time slot of the host
+        now = self._loop.time()
+        start = max(now, self._host_next_time.get(host, now))
+        self._host_next_time[host] = start + self.politeness_delay
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def _get(
+        self, url: str, headers: Optional[Dict[str, str]], polite: bool
+    ) -> httpx.Response:
+        if not polite:
+            async with self._global_semaphore:
+                return await self._client.get(url, headers=headers)
+
+        host = urllib.parse.urlsplit(url).netloc
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(self.per_host_concurrency)
+        async with self._host_semaphores[host]:
+            await self._wait_for_host(host)
+            async with self._global_semaphore:
+                return await self._client.get(url, headers=headers)
+
+    def get(
+        self,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        polite: bool = True,
+    ) -> httpx.Response:
+        """
+        Send a GET request from any thread. The API calls are not polite.
+        """
+        return self._run(self._get(url, headers, polite))
+
+    def close(self) -> None:
+        if self._loop.is_closed():
+            return
+        self._run(self._client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+class SingleFlight:
+    """
+    Deduplicate the work on the same keys among concurrent callers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures: Dict[str, Future] = {}
+
+    def claim(self, keys: List[str]) -> Tuple[List[str], Dict[str, Future]]:
+        """
+        Return the keys claimed by the caller and the futures of the other keys.
+        """
+        own_keys: List[str] = []
+        other_futures: Dict[str, Future] = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                if key in self._futures:
+                    other_futures[key] = self._futures[key]
+                else:
+                    self._futures[key] = Future()
+                    own_keys.append(key)
+        return own_keys, other_futures
+
+    def resolve(self, key: str, value: Any) -> None:
+        with self._lock:
+            future = self._futures.pop(key, None)
+        if future is not None:
+            future.set_result(value)
+
+    def fail(self, key: str, error: Exception) -> None:
+        with self._lock:
+            future = self._futures.pop(key, None)
+        if future is not None:
+            future.set_exception(error)
+
+
+class ConnectionStats:
+    """
+    Count the requests of an httpx.Client and the connections it opens.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+
+    def on_request(self, request: httpx.Request) -> None:
+        # registered as a request event hook of the client
+        with self._lock:
+            self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.new_connections += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    def snapshot(self) -> Tuple[int, int, int]:
+        with self._lock:
+            return self.requests, self.new_connections, self.tls_handshakes
+
+    def stats_str(self, since: Optional[Tuple[int, int, int]] = None) -> str:
+        """
+        The counts since the snapshot if given, including the concurrent queries.
+        """
+        requests, new_connections, tls_handshakes = self.snapshot()
+        if since is not None:
+            requests -= since[0]
+            new_connections -= since[1]
+            tls_handshakes -= since[2]
+        reused = max(0, requests - new_connections)
+        reuse_rate = reused / requests if requests > 0 else 0.0
+        return (
+            f"requests: {requests}, new connections: {new_connections}, "
+            f"TLS handshakes: {tls_handshakes}, reuse rate: {reuse_rate:.1%}"
+        )
+
+
+def _estimate_tokens(text: str) -> int:
+    # about 4 characters per token for English text
+    return len(text) // 4 + 1
+
+
+class EmbeddingBatcher:
+    """
+    Embed the texts of all the callers in batches packed up to the token and item
+    limits, with a token budget that adapts to the rate limits and the latency.
+    """
+
+    max_retry_delay = 30.0
+    too_large_error_codes = ("context_length_exceeded", "max_tokens_per_request")
+    too_large_error_pattern = re.compile(
+        r"maximum context length|tokens per request|too many tokens|token limit",
+        re.IGNORECASE,
+    )
+
+    def __init__(
+        self,
+        embed_fn: Callable[[List[str]], List[List[float]]],
+        max_batch_tokens: int,
+        max_batch_items: int,
+        max_concurrency: int,
+        max_retries: int,
+        target_latency: float,
+        logger: logging.Logger,
+    ):
+        self.embed_fn = embed_fn
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.target_latency = target_latency
+        self.logger = logger
+
+        self.batch_tokens = max_batch_tokens
+        self.request_count = 0
+        self.retry_count = 0
+        self.rate_limited_count = 0
+
+        self._lock = threading.Lock()
+        self._pending: deque = deque()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="embed"
+        )
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        futures: List[Future] = [Future() for _ in texts]
+        with self._lock:
+            self._pending.extend(zip(texts, futures))
+        for _ in range(min(self.max_concurrency, len(texts))):
+            self._executor.submit(self._drain)
+        return [future.result() for future in futures]
+
+    def stats_str(self) -> str:
+        return (
+            f"requests: {self.request_count}, retries: {self.retry_count}, "
+            f"rate limited: {self.rate_limited_count}, "
+            f"batch token budget: {self.batch_tokens}"
+        )
+
+    def _take_batch(self) -> List[Tuple[str, Future]]:
+        batch: List[Tuple[str, Future]] = []
+        batch_tokens = 0
+        with self._lock:
+            while len(self._pending) > 0 and len(batch) < self.max_batch_items:
+                tokens = _estimate_tokens(self._pending[0][0])
+                # a text larger than the budget is sent alone
+                if len(batch) > 0 and batch_tokens + tokens > self.batch_tokens:
+                    break
+                batch.append(self._pending.popleft())
+                batch_tokens += tokens
+        return batch
+
+    def _drain(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if len(batch) == 0:
+                return
+            try:
+                embeddings = self._embed_with_retry([text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+    def _embed_with_retry(self, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            start_time = time.perf_counter()
+            try:
+                with self._lock:
+                    self.request_count += 1
+                embeddings = self.embed_fn(texts)
+            except openai.BadRequestError as e:
+                # the token estimate was too low, split the batch in half
+                if len(texts) == 1 or not self._is_too_large_error(e):
+                    raise
+                self._adjust_budget(0.5)
+                middle = len(texts) // 2
+                first_half = self._embed_with_retry(texts[:middle])
+                return first_half + self._embed_with_retry(texts[middle:])
+            except openai.RateLimitError as e:
+                with self._lock:
+                    self.rate_limited_count += 1
+                self._adjust_budget(0.5)
+                delay = self._retry_after(e, attempt)
+            except (
+                openai.APIConnectionError,
+                openai.APITimeoutError,
+                openai.InternalServerError,
+            ) as e:
+                delay = self._retry_after(e, attempt)
+            else:
+                latency = time.perf_counter() - start_time
+                if latency > self.target_latency:
+                    self._adjust_budget(0.75)
+                else:
+                    self._adjust_budget(1.25)
+                return embeddings
+
+            attempt += 1
+            if attempt > self.max_retries:
+                raise Exception(
+                    f"Embedding request failed after {self.max_retries} retries."
+                )
+            with self._lock:
+                self.retry_count += 1
+            self.logger.warning(
+                f"Embedding request for {len(texts)} chunks failed, "
+                f"retrying in {delay:.1f}s ..."
+            )
+            time.sleep(delay)
+
+    def _adjust_budget(self, factor: float) -> None:
+        with self._lock:
+            self.batch_tokens = int(
+                min(self.max_batch_tokens, max(1, self.batch_tokens * factor))
+            )
+
+    def _is_too_large_error(self, error: openai.BadRequestError) -> bool:
+        if error.code in self.too_large_error_codes:
+            return True
+        return self.too_large_error_pattern.search(str(error.message)) is not None
+
+    def _retry_after(self, error: Exception, attempt: int) -> float:
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after is not None:
+                try:
+                    return min(self.max_retry_delay, max(0.0, float(retry_after)))
+                except ValueError:
+                    pass
+        # exponential backoff with jitter
+        return min(self.max_retry_delay, 2**attempt) * (0.5 + random.random() / 2)
+
+
+class LocalEmbeddingModel:
+    """
+    Embed texts in the process with a sentence-transformers model on the CPU.
+    Each call uses all the threads, so the calls are serialized.
+    """
+
+    def __init__(
+        self, model_name: str, backend: str, batch_size: int, num_threads: int
+    ):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        torch.set_num_threads(num_threads)
+        model_kwargs: Dict[str, Any] = {}
+        if backend == "onnx":
+            import onnxruntime
+
+            session_options = onnxruntime.SessionOptions()
+            session_options.intra_op_num_threads = num_threads
+            model_kwargs = {
+                "provider": "CPUExecutionProvider",
+                "session_options": session_options,
+            }
+        self.model = SentenceTransformer(
+            model_name, device="cpu", backend=backend, model_kwargs=model_kwargs
+        )
+        self.dimensions = self.model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        with self._lock:
+            embeddings = self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            )
+        return embeddings.astype(np.float32, copy=False)
+
+
+class LocalRerankModel:
+    """
+    Score the (query, chunk) pairs with a sentence-transformers cross-encoder.
+    """
+
+    def __init__(self, model_name: str, batch_size: int, num_threads: int):
+        import torch
+        from sentence_transformers import CrossEncoder
+
+        torch.set_num_threads(num_threads)
+        self.model = CrossEncoder(model_name, device="cpu")
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+
+    def score(self, query: str, texts: List[str]) -> np.ndarray:
+        with self._lock:
+            scores = self.model.predict(
+                [(query, text) for text in texts],
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        return np.asarray(scores, dtype=np.float32).reshape(len(texts))
+
+
+class DiskCache:
+    """
+    A simple key-value cache of bytes persisted in a SQLite file with LRU eviction.
+    """
+
+    # SQLite limits the number of variables in a single statement
+    _max_sql_variables = 500
+
+    def __init__(self, db_path: str, max_entries: int):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(db_path, check_same_thread=False)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._con.execute(
+            "CREATE INDEX IF NOT EXISTS cache_last_access_idx ON cache (last_access)"
+        )
+        self._con.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, bytes]:
+        found: Dict[str, bytes] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        now = time.time()
+        with self._lock:
+            for i in range(0, len(unique_keys), self._max_sql_variables):
+                key_batch = unique_keys[i : i + self._max_sql_variables]
+                placeholders = ", ".join(["?"] * len(key_batch))
+                rows = self._con.execute(
+                    f"SELECT key, value FROM cache WHERE key IN ({placeholders})",
+                    key_batch,
+                ).fetchall()
+                found.update({key: value for key, value in rows})
+                self._con.execute(
+                    f"UPDATE cache SET last_access = ? WHERE key IN ({placeholders})",
+                    [now] + key_batch,
+                )
+            self._con.commit()
+            self.hits += len(found)
+            self.misses += len(unique_keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, bytes]) -> None:
+        if len(items) == 0:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._con.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, last_access) VALUES (?, ?, ?)",
+                [(key, value, now) for key, value in items.items()],
+            )
+            count = self._con.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+            if count > self.max_entries:
+                # evict down to 90% of the limit so that we do not evict on every put
+                evict_count = count - int(self.max_entries * 0.9)
+                self._con.execute(
+                    """
+                    DELETE FROM cache WHERE key IN (
+                        SELECT key FROM cache ORDER BY last_access LIMIT ?
+                    )
+                    """,
+                    (evict_count,),
+                )
+            self._con.commit()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def put(self, key: str, value: bytes) -> None:
+        self.put_many({key: value})
+
+    def stats_str(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total > 0 else 0.0
+        return f"hits: {self.hits}, misses: {self.misses}, hit rate: {hit_rate:.1%}"
+
+
 class Ask:
 
-    def __init__(self, logger: Optional[logging.Logger] = None):
+    def __init__(
+        self,
+        logger: Optional[logging.Logger] = None,
+        scrape_concurrency: Optional[int] = None,
+        data_dir: Optional[str] = None,
+        data_include: Optional[List[str]] = None,
+        data_exclude: Optional[List[str]] = None,
+        background_refresh: bool = False,
+    ):
+        """
+        If background_refresh is True, the stale cached answers are refreshed in
+        background threads, e.g., in the Gradio UI.
+        """
         if logger is not None:
             self.logger = logger
         else:
             self.logger = _get_logger("INFO")
+        if not any(isinstance(h, _QueryLogHandler) for h in self.logger.handlers):
+            self.logger.addHandler(_QueryLogHandler())
 
+        init_start_time = time.perf_counter()
         self.read_env_variables()
+        if scrape_concurrency is not None:
+            self.scrape_concurrency = scrape_concurrency
+        if data_dir:
+            self.data_dir = os.path.abspath(data_dir)
+        if data_include:
+            self.data_include = list(data_include)
+        if data_exclude:
+            self.data_exclude = list(data_exclude)
+
+        # (import seconds, init seconds) of the components initialized on first use
+        self.startup_profile: Dict[str, Tuple[float, float]] = {}
+        self._init_lock = threading.RLock()
+        self._converter = None
+        self._chunker = None
+        self._extract_chunker = None
+        self._db_con = None
+        self._db_local = threading.local()
+        self.vector_index_checked = False
+        self._local_embedding_model: Optional[LocalEmbeddingModel] = None
+        self._rerank_model: Optional[LocalRerankModel] = None
+        # the tables whose full text search index is missing or out of date
+        self.fts_stale_tables = set()
+        # the number of changed chunks and the time of the first change
+        self.fts_pending_changes: Dict[str, Tuple[int, float]] = {}
+
+        self.init_embedding_cache()
+        self.init_scrape_cache()
+        self.init_search_cache()
+        self.init_conversion_cache()
+        self.init_answer_cache()
+
+        # created on first use
+        self._parse_pool: Optional[ProcessPoolExecutor] = None
+        self._fanout_executor: Optional[ThreadPoolExecutor] = None
+        self._convert_pool: Optional[ProcessPoolExecutor] = None
+
+        self.data_indexer: Optional[DataFolderIndexer] = None
+
+        self.init_api_clients()
+
+        self.embedding_batcher = EmbeddingBatcher(
+            embed_fn=self._embed_texts_with_api,
+            max_batch_tokens=self.embed_max_batch_tokens,
+            max_batch_items=self.embed_max_batch_items,
+            max_concurrency=self.embed_concurrency,
+            max_retries=self.embed_max_retries,
+            target_latency=self.embed_target_latency,
+            logger=self.logger,
+        )
 
-        self.init_converter()
-        self.init_chunker()
-        self.init_db()
+        # share the scraping and embedding work among concurrent queries
+        self._scrape_flight = SingleFlight()
+        self._embed_flight = SingleFlight()
+        self.background_refresh = background_refresh
+        self._answer_flight = SingleFlight()
+        self._answer_refresh_executor: Optional[ThreadPoolExecutor] = None
+        self._compact_executor: Optional[ThreadPoolExecutor] = None
+        # serializes the writes to the persistent tables
+        self._db_lock = threading.RLock()
 
-        self.session = requests.Session()
         user_agent: str = (
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
             "AppleWebKit/537.36 (KHTML, like Gecko) "
             "Chrome/119.0.0.0 Safari/537.36 Edg/119.0.0.0"
         )
-        self.session.headers.update({"User-Agent": user_agent})
+        self.http_client = AsyncHttpClient(
+            max_concurrency=self.scrape_concurrency,
+            per_host_concurrency=self.scrape_per_host_concurrency,
+            politeness_delay=self.scrape_politeness_delay,
+            http2=self.scrape_http2,
+            headers={"User-Agent": user_agent},
+            timeout=10,
+            logger=self.logger,
+        )
+        self.startup_profile["ask"] = (0.0, time.perf_counter() - init_start_time)
+
+    def close(self) -> None:
+        """Stop the background threads and release the resources of the instance."""
+        if self._answer_refresh_executor is not None:
+            self._answer_refresh_executor.shutdown(wait=False, cancel_futures=True)
+            self._answer_refresh_executor = None
+        if self._compact_executor is not None:
+            self._compact_executor.shutdown(wait=False, cancel_futures=True)
+            self._compact_executor = None
+        if self._parse_pool is not None:
+            self._parse_pool.shutdown(cancel_futures=True)
+            self._parse_pool = None
+        if self._convert_pool is not None:
+            self._convert_pool.shutdown(cancel_futures=True)
+            self._convert_pool = None
+        if self._fanout_executor is not None:
+            self._fanout_executor.shutdown(wait=False, cancel_futures=True)
+            self._fanout_executor = None
+        self.http_client.close()
 
     def read_env_variables(self) -> None:
         err_msg = ""
@@ -143,6 +1237,19 @@ class Ask:
         if self.search_project_id is None:
             err_msg += "SEARCH_PROJECT_KEY env variable is not set.\n"
 
+        # the search API returns 10 results per page, at most 100 in total
+        self.search_result_count = min(
+            100, int(os.environ.get("SEARCH_RESULT_COUNT", "10"))
+        )
+
+        self.query_rewrite_mode = os.environ.get("QUERY_REWRITE_MODE", "llm").lower()
+        if self.query_rewrite_mode not in ("llm", "heuristic"):
+            err_msg += "QUERY_REWRITE_MODE env variable must be llm or heuristic.\n"
+        self.query_fanout_budget = float(os.environ.get("QUERY_FANOUT_BUDGET", "10"))
+        self.query_fanout_max_urls = int(
+            os.environ.get("QUERY_FANOUT_MAX_URLS", "20")
+        )
+
         self.llm_base_url = os.environ.get("LLM_BASE_URL")
         if self.llm_base_url is None:
             self.llm_base_url = "https://api.openai.com/v1"
@@ -172,82 +1279,843 @@ class Ask:
         self.embedding_dimensions = os.environ.get("EMBEDDING_DIMENSIONS")
 
         if self.embedding_model is None or self.embedding_dimensions is None:
+            if self.embedding_model is not None and self.embedding_model.startswith(
+                local_embedding_prefix
+            ):
+                err_msg += (
+                    "EMBEDDING_DIMENSIONS env variable is required for the local "
+                    "embedding model.\n"
+                )
             self.embedding_model = "text-embedding-3-small"
             self.embedding_dimensions = 1536
 
+        self.local_embedding = self.embedding_model.startswith(local_embedding_prefix)
+        # torch or onnx
+        self.local_embed_backend = os.environ.get("LOCAL_EMBED_BACKEND", "torch")
+        self.local_embed_batch_size = int(
+            os.environ.get("LOCAL_EMBED_BATCH_SIZE", "64")
+        )
+        self.local_embed_threads = int(
+            os.environ.get("LOCAL_EMBED_THREADS", str(os.cpu_count() or 1))
+        )
+
+        self.embed_max_batch_tokens = int(
+            os.environ.get("EMBED_MAX_BATCH_TOKENS", "100000")
+        )
+        self.embed_max_batch_items = int(
+            os.environ.get("EMBED_MAX_BATCH_ITEMS", "2048")
+        )
+        self.embed_concurrency = int(os.environ.get("EMBED_CONCURRENCY", "8"))
+        self.embed_max_retries = int(os.environ.get("EMBED_MAX_RETRIES", "5"))
+        self.embed_target_latency = float(
+            os.environ.get("EMBED_TARGET_LATENCY", "10")
+        )
+
+        # the HTTP client shared by the LLM and embedding API clients
+        self.llm_max_connections = int(os.environ.get("LLM_MAX_CONNECTIONS", "64"))
+        self.llm_max_keepalive_connections = int(
+            os.environ.get("LLM_MAX_KEEPALIVE_CONNECTIONS", "32")
+        )
+        self.llm_keepalive_expiry = float(
+            os.environ.get("LLM_KEEPALIVE_EXPIRY", "60")
+        )
+        self.llm_timeout = float(os.environ.get("LLM_TIMEOUT", "120"))
+        self.llm_connect_timeout = float(os.environ.get("LLM_CONNECT_TIMEOUT", "10"))
+
+        self.gradio_concurrency = int(os.environ.get("GRADIO_CONCURRENCY", "4"))
+
+        self.cache_dir = os.environ.get("CACHE_DIR")
+        if self.cache_dir is None:
+            self.cache_dir = default_cache_dir
+
+        # use the DuckDB defaults if not set
+        self.hnsw_ef_search = os.environ.get("HNSW_EF_SEARCH")
+        self.duckdb_threads = os.environ.get("DUCKDB_THREADS")
+
+        self.retrieval_candidates = int(
+            os.environ.get("RETRIEVAL_CANDIDATES", "30")
+        )
+        # rrf or weighted
+        self.fusion_method = os.environ.get("FUSION_METHOD", "rrf").lower()
+        if self.fusion_method not in ("rrf", "weighted"):
+            err_msg += "FUSION_METHOD env variable must be rrf or weighted.\n"
+        self.fusion_vector_weight = float(
+            os.environ.get("FUSION_VECTOR_WEIGHT", "0.5")
+        )
+        # no reranking if not set
+        self.rerank_model_name = os.environ.get("RERANK_MODEL") or None
+        self.rerank_batch_size = int(os.environ.get("RERANK_BATCH_SIZE", "32"))
+
+        self.pipeline_fetch_concurrency = int(
+            os.environ.get("PIPELINE_FETCH_CONCURRENCY", "10")
+        )
+        self.pipeline_chunk_concurrency = int(
+            os.environ.get("PIPELINE_CHUNK_CONCURRENCY", "4")
+        )
+        self.pipeline_embed_concurrency = int(
+            os.environ.get("PIPELINE_EMBED_CONCURRENCY", "8")
+        )
+
+        self.extract_concurrency = int(os.environ.get("EXTRACT_CONCURRENCY", "4"))
+        self.extract_max_tokens = int(os.environ.get("EXTRACT_MAX_TOKENS", "16000"))
+
+        self.inference_streaming = (
+            os.environ.get("INFERENCE_STREAMING", "true").lower() == "true"
+        )
+
+        # set the max entries to 0 to disable a cache
+        self.embedding_cache_max_entries = int(
+            os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "50000")
+        )
+
+        self.scrape_cache_max_entries = int(
+            os.environ.get("SCRAPE_CACHE_MAX_ENTRIES", "10000")
+        )
+        self.scrape_cache_ttl = int(os.environ.get("SCRAPE_CACHE_TTL", "3600"))
+
+        self.search_cache_max_entries = int(
+            os.environ.get("SEARCH_CACHE_MAX_ENTRIES", "1000")
+        )
+        self.search_cache_ttl = int(os.environ.get("SEARCH_CACHE_TTL", "86400"))
+
+        self.answer_cache_max_entries = int(
+            os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "1000")
+        )
+        self.answer_cache_ttl = int(os.environ.get("ANSWER_CACHE_TTL", "3600"))
+        self.answer_cache_stale_while_revalidate = (
+            os.environ.get("ANSWER_CACHE_STALE_WHILE_REVALIDATE", "false").lower()
+            == "true"
+        )
+
+        self.conversion_cache_max_entries = int(
+            os.environ.get("CONVERSION_CACHE_MAX_ENTRIES", "1000")
+        )
+        # 0 to convert the files in the query process
+        self.local_convert_workers = int(
+            os.environ.get("LOCAL_CONVERT_WORKERS", str(min(4, os.cpu_count() or 1)))
+        )
+
+        self.html_text_extractor = os.environ.get("HTML_TEXT_EXTRACTOR", "lxml")
+        if self.html_text_extractor not in text_extractors:
+            err_msg += (
+                f"HTML_TEXT_EXTRACTOR should be one of {list(text_extractors.keys())}.\n"
+            )
+            self.html_text_extractor = "lxml"
+
+        self.scrape_concurrency = int(os.environ.get("SCRAPE_CONCURRENCY", "20"))
+        self.scrape_per_host_concurrency = int(
+            os.environ.get("SCRAPE_PER_HOST_CONCURRENCY", "2")
+        )
+        self.scrape_politeness_delay = float(
+            os.environ.get("SCRAPE_POLITENESS_DELAY", "0.25")
+        )
+        self.scrape_http2 = os.environ.get("SCRAPE_HTTP2", "false").lower() == "true"
+
+        # 0 to parse the pages in the scraping process
+        self.scrape_parse_workers = int(
+            os.environ.get("SCRAPE_PARSE_WORKERS", str(min(4, os.cpu_count() or 1)))
+        )
+        self.scrape_parse_min_bytes = int(
+            os.environ.get("SCRAPE_PARSE_MIN_BYTES", "262144")
+        )
+
+        # a new in-memory table is used for each query if not set
+        self.corpus_db_file = os.environ.get("CORPUS_DB_FILE", "")
+        self.corpus_max_age_days = int(os.environ.get("CORPUS_MAX_AGE_DAYS", "30"))
+        self.corpus_compact_interval = int(
+            os.environ.get("CORPUS_COMPACT_INTERVAL", "100")
+        )
+        self.fts_rebuild_min_changes = int(
+            os.environ.get("FTS_REBUILD_MIN_CHANGES", "1000")
+        )
+        self.fts_rebuild_max_age = int(os.environ.get("FTS_REBUILD_MAX_AGE", "600"))
+
+        self.data_dir = os.path.abspath(os.environ.get("DATA_DIR", default_data_dir))
+        self.data_include = [
+            glob.strip()
+            for glob in os.environ.get("DATA_INCLUDE", "").split(",")
+            if glob.strip() != ""
+        ]
+        self.data_exclude = [
+            glob.strip()
+            for glob in os.environ.get("DATA_EXCLUDE", "").split(",")
+            if glob.strip() != ""
+        ]
+        self.local_ingest_batch_size = int(
+            os.environ.get("LOCAL_INGEST_BATCH_SIZE", "32")
+        )
+
+        self.data_watch_interval = float(os.environ.get("DATA_WATCH_INTERVAL", "10"))
+
         if err_msg != "":
             raise Exception(f"\n{err_msg}\n")
 
+    def _lazy_init(
+        self, component: str, module_name: str, init_fn: Callable[[], None]
+    ) -> None:
+        """
+        Import the module and run init_fn once, and record the time of each step.
+        """
+        with self._init_lock:
+            if component in self.startup_profile:
+                return
+            start_time = time.perf_counter()
+            importlib.import_module(module_name)
+            import_seconds = time.perf_counter() - start_time
+            init_fn()
+            init_seconds = time.perf_counter() - start_time - import_seconds
+            self.startup_profile[component] = (import_seconds, init_seconds)
+
+    @property
+    def converter(self) -> "DocumentConverter":
+        if self._converter is None:
+            self._lazy_init(
+                "docling", "docling.document_converter", self.init_converter
+            )
+        return self._converter
+
+    @property
+    def chunker(self) -> "TokenChunker":
+        if self._chunker is None:
+            self._lazy_init("chonkie", "chonkie", self.init_chunker)
+        return self._chunker
+
+    @property
+    def extract_chunker(self) -> "TokenChunker":
+        if self._extract_chunker is None:
+            self._lazy_init("chonkie", "chonkie", self.init_chunker)
+        return self._extract_chunker
+
+    @property
+    def db_con(self) -> "duckdb.DuckDBPyConnection":
+        if self._db_con is None:
+            self._lazy_init("duckdb", "duckdb", self.init_db)
+        return self._db_con
+
+    @property
+    def db_cursor(self) -> "duckdb.DuckDBPyConnection":
+        """
+        The DuckDB cursor of the calling thread, so the queries run in parallel.
+        """
+        cursor = getattr(self._db_local, "cursor", None)
+        if cursor is None:
+            cursor = self.db_con.cursor()
+            # the session settings are not inherited from the parent connection
+            if self.hnsw_ef_search:
+                cursor.execute(f"SET hnsw_ef_search = {int(self.hnsw_ef_search)}")
+            self._db_local.cursor = cursor
+        return cursor
+
+    @property
+    def local_embedding_model(self) -> LocalEmbeddingModel:
+        if self._local_embedding_model is None:
+            try:
+                self._lazy_init(
+                    "embedding",
+                    "sentence_transformers",
+                    self.init_local_embedding_model,
+                )
+            except ImportError as e:
+                raise Exception(
+                    "The local embedding model requires the sentence-transformers "
+                    f"package, install it with: pip install '.[local-embedding]' ({e})"
+                )
+        return self._local_embedding_model
+
+    @property
+    def rerank_model(self) -> LocalRerankModel:
+        if self._rerank_model is None:
+            try:
+                self._lazy_init(
+                    "rerank", "sentence_transformers", self.init_rerank_model
+                )
+            except ImportError as e:
+                raise Exception(
+                    "The reranker requires the sentence-transformers package, "
+                    f"install it with: pip install '.[local-embedding]' ({e})"
+                )
+        return self._rerank_model
+
+    def init_all_components(self) -> None:
+        """
+        Initialize all the lazily initialized components, e.g., to profile them.
+        """
+        self.converter
+        self.chunker
+        self.db_con
+        self._load_fts_extension()
+        if self.local_embedding:
+            self.local_embedding_model
+        if self.rerank_model_name:
+            self.rerank_model
+
+    def format_startup_profile(self) -> str:
+        lines = [f"{'component':<12} {'import (s)':>10} {'init (s)':>10}"]
+        for component, (import_seconds, init_seconds) in self.startup_profile.items():
+            lines.append(
+                f"{component:<12} {import_seconds:>10.3f} {init_seconds:>10.3f}"
+            )
+        return "\n".join(lines)
+
+    def init_local_embedding_model(self) -> None:
+        model_name = self.embedding_model[len(local_embedding_prefix) :]
+        self.logger.info(f"Initializing local embedding model {model_name} ...")
+        model = LocalEmbeddingModel(
+            model_name=model_name,
+            backend=self.local_embed_backend,
+            batch_size=self.local_embed_batch_size,
+            num_threads=self.local_embed_threads,
+        )
+        if model.dimensions != int(self.embedding_dimensions):
+            raise Exception(
+                f"The local embedding model {model_name} has {model.dimensions} "
+                f"dimensions, but EMBEDDING_DIMENSIONS is {self.embedding_dimensions}."
+            )
+        self._local_embedding_model = model
+        self.logger.info("✅ Successfully initialized local embedding model.")
+
+    def init_rerank_model(self) -> None:
+        self.logger.info(f"Initializing rerank model {self.rerank_model_name} ...")
+        self._rerank_model = LocalRerankModel(
+            model_name=self.rerank_model_name,
+            batch_size=self.rerank_batch_size,
+            num_threads=self.local_embed_threads,
+        )
+        self.logger.info("✅ Successfully initialized rerank model.")
+
     def init_converter(self) -> None:
         from docling.document_converter import DocumentConverter
 
         self.logger.info("Initializing converter ...")
-        self.converter = DocumentConverter()
+        self._converter = DocumentConverter()
         self.logger.info("✅ Successfully initialized Docling.")
 
     def init_chunker(self) -> None:
         from chonkie import TokenChunker
 
         self.logger.info("Initializing chunker ...")
-        self.chunker = TokenChunker(chunk_size=1000, chunk_overlap=100)
+        self._chunker = TokenChunker(chunk_size=1000, chunk_overlap=100)
+        # larger chunks to split the documents for extraction
+        self._extract_chunker = TokenChunker(
+            chunk_size=self.extract_max_tokens, chunk_overlap=200
+        )
         self.logger.info("✅ Successfully initialized Chonkie.")
 
     def init_db(self) -> None:
         import duckdb
 
         self.logger.info("Initializing database ...")
-        self.db_con = duckdb.connect(":memory:")
-        self.db_con.install_extension("vss")
-        self.db_con.load_extension("vss")
-        self.db_con.install_extension("fts")
-        self.db_con.load_extension("fts")
-        self.db_con.sql("CREATE SEQUENCE seq_docid START 1000")
+        if self.corpus_db_file:
+            db_con = duckdb.connect(self.corpus_db_file)
+        else:
+            db_con = duckdb.connect(":memory:")
+        # the full text search extension is loaded when hybrid search is first used
+        _load_duckdb_extension(db_con, "vss")
+        db_con.sql("CREATE SEQUENCE IF NOT EXISTS seq_docid START 1000")
+        if self.hnsw_ef_search:
+            db_con.execute(f"SET hnsw_ef_search = {int(self.hnsw_ef_search)}")
+        # the threads are shared by the cursors of all the concurrent queries
+        if self.duckdb_threads:
+            db_con.execute(f"SET threads = {int(self.duckdb_threads)}")
+        if self.corpus_db_file:
+            self._create_persistent_tables(db_con, corpus_table_name)
+            self.corpus_query_count = 0
+            self.logger.info(f"Using the persistent corpus in {self.corpus_db_file}.")
+        # set last so that other threads do not use the connection before it is ready
+        self._db_con = db_con
         self.logger.info("✅ Successfully initialized DuckDB.")
 
-    def convert_file_to_md(self, file_path: str) -> str:
-        result = self.converter.convert(file_path)
-        return result.document.export_to_markdown()
+    def _load_fts_extension(self) -> None:
+        db_con = self.db_con
+        self._lazy_init(
+            "duckdb-fts", "duckdb", partial(_load_duckdb_extension, db_con, "fts")
+        )
 
-    def search_web(self, query: str, settings: AskSettings) -> List[str]:
-        escaped_query = urllib.parse.quote(query)
-        url_base = (
-            f"{self.search_api_url}?key={self.search_api_key}"
-            f"&cx={self.search_project_id}&q={escaped_query}"
+    def init_embedding_cache(self) -> None:
+        if self.embedding_cache_max_entries <= 0:
+            self.embedding_cache = None
+            return
+
+        cache_file = os.path.join(self.cache_dir, "embeddings.db")
+        self.logger.info(f"Initializing embedding cache at {cache_file} ...")
+        self.embedding_cache = DiskCache(
+            db_path=cache_file, max_entries=self.embedding_cache_max_entries
         )
-        url_paras = f"&safe=active"
-        if settings.date_restrict > 0:
-            url_paras += f"&dateRestrict={settings.date_restrict}"
-        if settings.target_site:
-            url_paras += f"&siteSearch={settings.target_site}&siteSearchFilter=i"
-        url = f"{url_base}{url_paras}"
+        self.logger.info("✅ Successfully initialized embedding cache.")
 
-        self.logger.debug(f"Searching for query: {query}")
+    def init_scrape_cache(self) -> None:
+        if self.scrape_cache_max_entries <= 0:
+            self.scrape_cache = None
+            return
 
-        resp = requests.get(url)
+        cache_file = os.path.join(self.cache_dir, "pages.db")
+        self.logger.info(f"Initializing scrape cache at {cache_file} ...")
+        self.scrape_cache = DiskCache(
+            db_path=cache_file, max_entries=self.scrape_cache_max_entries
+        )
+        self.logger.info("✅ Successfully initialized scrape cache.")
 
-        if resp is None:
-            raise Exception("No response from search API")
+    def init_search_cache(self) -> None:
+        if self.search_cache_max_entries <= 0:
+            self.search_cache = None
+            return
+
+        cache_file = os.path.join(self.cache_dir, "search.db")
+        self.logger.info(f"Initializing search cache at {cache_file} ...")
+        self.search_cache = DiskCache(
+            db_path=cache_file, max_entries=self.search_cache_max_entries
+        )
+        self.logger.info("✅ Successfully initialized search cache.")
+
+    def init_conversion_cache(self) -> None:
+        if self.conversion_cache_max_entries <= 0:
+            self.conversion_cache = None
+            return
+
+        cache_file = os.path.join(self.cache_dir, "conversions.db")
+        self.logger.info(f"Initializing conversion cache at {cache_file} ...")
+        self.conversion_cache = DiskCache(
+            db_path=cache_file, max_entries=self.conversion_cache_max_entries
+        )
+        self.logger.info("✅ Successfully initialized conversion cache.")
+
+    def init_answer_cache(self) -> None:
+        if self.answer_cache_max_entries <= 0:
+            self.answer_cache = None
+            return
+
+        cache_file = os.path.join(self.cache_dir, "answers.db")
+        self.logger.info(f"Initializing answer cache at {cache_file} ...")
+        self.answer_cache = DiskCache(
+            db_path=cache_file, max_entries=self.answer_cache_max_entries
+        )
+        self.logger.info("✅ Successfully initialized answer cache.")
+
+    def convert_file_to_md(self, file_path: str) -> str:
+        result = self.converter.convert(file_path)
+        return result.document.export_to_markdown()
+
+    def _conversion_cache_key(self, file_path: str) -> str:
+        # a modified file gets a new key, and the old entry is evicted as it ages
+        stat = os.stat(file_path)
+        return f"{os.path.abspath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def _get_cached_conversions(self, file_paths: List[str]) -> Dict[str, str]:
+        """
+        Return the cached markdown of the files keyed by the file path.
+        """
+        if self.conversion_cache is None:
+            return {}
+        keys = {path: self._conversion_cache_key(path) for path in file_paths}
+        cached_values = self.conversion_cache.get_many(list(keys.values()))
+        return {
+            file_path: cached_values[key].decode("utf-8")
+            for file_path, key in keys.items()
+            if key in cached_values
+        }
+
+    def _save_conversions_to_cache(self, markdowns: Dict[str, str]) -> None:
+        if self.conversion_cache is None:
+            return
+        self.conversion_cache.put_many(
+            {
+                self._conversion_cache_key(file_path): markdown.encode("utf-8")
+                for file_path, markdown in markdowns.items()
+            }
+        )
+
+    def _convert_local_file(self, file_path: str) -> Tuple[str, str]:
+        file_uri = f"file://{file_path}"
+        cached = self._get_cached_conversions([file_path])
+        if file_path in cached:
+            return file_uri, cached[file_path]
+
+        self.logger.info(f"Processing {os.path.basename(file_path)} ...")
+        markdown = self.convert_file_to_md(file_path)
+        self._save_conversions_to_cache({file_path: markdown})
+        return file_uri, markdown
+
+    def start_data_indexer(self) -> None:
+        """
+        Index the files in the data folder in a background thread.
+        """
+        if self.data_indexer is not None:
+            return
+        self.data_indexer = DataFolderIndexer(
+            ask=self,
+            interval=self.data_watch_interval,
+            logger=self.logger,
+        )
+        self.data_indexer.start()
+
+    def list_data_files(self) -> Generator[str, None, None]:
+        if not os.path.isdir(self.data_dir):
+            raise Exception(f"Data folder {self.data_dir} not found.")
+        return _list_data_files(self.data_dir, self.data_include, self.data_exclude)
+
+    def ingest_local_files(
+        self,
+        file_paths: Iterable[str],
+        fts_index: bool = True,
+        table_name: Optional[str] = None,
+    ) -> Tuple[str, List[str]]:
+        """
+        Convert, chunk, embed and save the local files in batches, the file_paths can
+        be a generator. The default table is the corpus or a new table for the query.
+
+        Returns:
+        - the name of the table with the chunks
+        - the URIs of all the files
+        """
+        if table_name is None:
+            if self.corpus_db_file:
+                table_name = corpus_table_name
+            else:
+                timestamp = datetime.now().strftime("%Y_%m_%d_%H_%M_%S_%f")
+                table_name = f"local_chunks_{timestamp}"
+                self.ensure_persistent_tables(table_name)
+
+        file_uris: List[str] = []
+        chunk_count = 0
+        start_time = time.perf_counter()
+        for batch in _batched(file_paths, self.local_ingest_batch_size):
+            documents = self.convert_local_files(batch)
+            file_uris.extend([f"file://{file_path}" for file_path in batch])
+            new_documents = self.filter_new_documents(documents, table_name=table_name)
+            content_hashes = {
+                url: _content_hash(text) for url, text in new_documents.items()
+            }
+            all_chunks = self.chunk_results(new_documents)
+            # the full text search index is built once after all the batches
+            self.save_chunks_to_db(
+                all_chunks, content_hashes, fts_index=False, table_name=table_name
+            )
+            chunk_count += sum([len(chunks) for chunks in all_chunks.values()])
+            elapsed = time.perf_counter() - start_time
+            self.logger.info(
+                f"Ingested {len(file_uris)} files and {chunk_count} new chunks, "
+                f"{len(file_uris) / elapsed:.1f} files/s, "
+                f"{chunk_count / elapsed:.1f} chunks/s."
+            )
+
+        if fts_index and table_name in self.fts_stale_tables:
+            with self._db_lock:
+                self._create_fts_index(table_name)
+        return table_name, file_uris
+
+    def _get_convert_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.local_convert_workers <= 0:
+            return None
+        if self._convert_pool is None:
+            self._convert_pool = ProcessPoolExecutor(
+                max_workers=self.local_convert_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._convert_pool
+
+    def convert_local_files(self, file_paths: List[str]) -> Dict[str, str]:
+        """
+        Convert the uncached local files to markdown and return them by file URI.
+        """
+        markdowns = self._get_cached_conversions(file_paths)
+        uncached_paths = [path for path in file_paths if path not in markdowns]
+        self.logger.info(
+            f"Found {len(markdowns)} of {len(file_paths)} files in the conversion "
+            f"cache, converting {len(uncached_paths)} files ..."
+        )
+
+        new_markdowns: Dict[str, str] = {}
+        convert_pool = None
+        if len(uncached_paths) > 1:
+            convert_pool = self._get_convert_pool()
+        if convert_pool is None:
+            for file_path in uncached_paths:
+                self.logger.info(f"Processing {os.path.basename(file_path)} ...")
+                new_markdowns[file_path] = self.convert_file_to_md(file_path)
+        else:
+            futures = {
+                convert_pool.submit(_convert_file_in_worker, file_path): file_path
+                for file_path in uncached_paths
+            }
+            for future in as_completed(futures):
+                file_path = futures[future]
+                try:
+                    markdown, seconds = future.result()
+                except Exception as e:
+                    self.logger.error(f"Failed to convert {file_path}: {e}")
+                    continue
+                new_markdowns[file_path] = markdown
+                self.logger.info(
+                    f"✅ Converted {os.path.basename(file_path)} in {seconds:.2f}s."
+                )
+
+        self._save_conversions_to_cache(new_markdowns)
+        markdowns.update(new_markdowns)
+        if self.conversion_cache is not None:
+            self.logger.info(f"Conversion cache: {self.conversion_cache.stats_str()}.")
+        return {
+            f"file://{file_path}": markdowns[file_path]
+            for file_path in file_paths
+            if file_path in markdowns
+        }
+
+    def search_web(self, query: str, settings: AskSettings) -> List[str]:
+        """
+        Return up to search_result_count links, the later pages fetched in parallel.
+        """
+        first_links, total_results = self._search_page(query, settings, 1)
+        page_links = [first_links]
+        starts = list(range(11, min(self.search_result_count, total_results) + 1, 10))
+        if len(starts) > 0:
+            with ThreadPoolExecutor(max_workers=len(starts)) as executor:
+                futures = [
+                    _submit_in_context(
+                        executor, self._search_page, query, settings, start
+                    )
+                    for start in starts
+                ]
+                # the errors of the later pages only lose their results
+                for start, future in zip(starts, futures):
+                    try:
+                        page_links.append(future.result()[0])
+                    except Exception as e:
+                        self.logger.warning(f"Search result page at {start} failed: {e}")
+
+        found_links = list(dict.fromkeys(itertools.chain(*page_links)))
+        return found_links[: self.search_result_count]
+
+    def generate_query_variants(self, query: str, settings: AskSettings) -> List[str]:
+        """
+        Return at most settings.query_variants rewrites of the query.
+        """
+        if settings.query_variants <= 0:
+            return []
+
+        variants: List[str] = []
+        if self.query_rewrite_mode == "llm":
+            try:
+                variants = self._rewrite_query_with_llm(query, settings)
+            except Exception as e:
+                self.logger.warning(
+                    f"Query rewrite failed: {e}, using the heuristic variants."
+                )
+        variants += _heuristic_query_variants(query)
+
+        # remove the variants that are the same as the query or each other
+        seen = {" ".join(query.lower().split())}
+        unique_variants: List[str] = []
+        for variant in variants:
+            normalized = " ".join(variant.lower().split())
+            if normalized == "" or normalized in seen:
+                continue
+            seen.add(normalized)
+            unique_variants.append(variant)
+        return unique_variants[: settings.query_variants]
+
+    def _rewrite_query_with_llm(self, query: str, settings: AskSettings) -> List[str]:
+        user_prompt = self._render_template(
+            """
+Write {{ count }} different web search queries that would find the information
+needed to answer the following question. Use different keywords and phrasings,
+and write one query per line without numbering or quotes.
+
+{{ query }}
+""",
+            {"count": settings.query_variants, "query": query},
+        )
+        # the rewrite is not worth waiting longer than the fan-out budget
+        api_client = self._get_inference_api_client().with_options(
+            timeout=self.query_fanout_budget, max_retries=0
+        )
+        completion = api_client.chat.completions.create(
+            model=self._get_final_inference_model(settings),
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are an expert writing web search queries.",
+                },
+                {"role": "user", "content": user_prompt},
+            ],
+        )
+        if completion is None:
+            raise Exception("No completion from the API")
+
+        variants = []
+        for line in (completion.choices[0].message.content or "").splitlines():
+            variant = re.sub(r"^\s*(?:[-*]|\d+[.)])\s*", "", line).strip().strip('"')
+            if variant:
+                variants.append(variant)
+        return variants
+
+    def _get_fanout_executor(self) -> ThreadPoolExecutor:
+        # shared by the queries to reuse the threads and their DB cursors
+        if self._fanout_executor is None:
+            with self._init_lock:
+                if self._fanout_executor is None:
+                    self._fanout_executor = ThreadPoolExecutor(
+                        max_workers=16, thread_name_prefix="fanout"
+                    )
+        return self._fanout_executor
+
+    def _run_fanout(
+        self,
+        fn: Callable[[str], Any],
+        queries: List[str],
+        wait_for_late: bool = False,
+    ) -> List[Any]:
+        """
+        Run fn on the first query in the calling thread and on the variants in the
+        fan-out threads, skipping the variants that fail or miss the fan-out budget.
+        If wait_for_late is True, the running late variants are waited for.
+        """
+        deadline = time.perf_counter() + self.query_fanout_budget
+        executor = self._get_fanout_executor()
+        futures = [_submit_in_context(executor, fn, query) for query in queries[1:]]
+        results = []
+        try:
+            results.append(fn(queries[0]))
+            for query, future in zip(queries[1:], futures):
+                try:
+                    results.append(
+                        future.result(timeout=max(0.0, deadline - time.perf_counter()))
+                    )
+                except TimeoutError:
+                    self.logger.warning(
+                        f"Query variant '{query}' did not finish in the fan-out budget."
+                    )
+                except Exception as e:
+                    self.logger.warning(f"Query variant '{query}' failed: {e}")
+        finally:
+            # a running future cannot be cancelled
+            for future in futures:
+                future.cancel()
+            if wait_for_late:
+                wait(futures)
+        return results
+
+    def search_web_fanout(self, queries: List[str], settings: AskSettings) -> List[str]:
+        """
+        Search the web for the query and its variants in parallel, and return the
+        deduplicated links of all of them, at most query_fanout_max_urls.
+        """
+        if len(queries) == 1:
+            return self.search_web(queries[0], settings)
+
+        link_lists = self._run_fanout(
+            lambda query: self.search_web(query, settings), queries
+        )
+        return _interleave_links(link_lists)[: self.query_fanout_max_urls]
+
+    def search_chunks(
+        self,
+        table_name: str,
+        queries: List[str],
+        settings: AskSettings,
+        urls: Optional[List[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Run the vector search of the query and its variants in parallel, fuse the
+        ranked chunk lists with reciprocal rank fusion, and rerank the fused chunks
+        against the original query into the top_k chunks.
+        """
+        if len(queries) == 1:
+            return self.vector_search(table_name, queries[0], settings, urls=urls)
+
+        # the query and the variants are embedded in one request
+        query_vecs = dict(zip(queries, self.embed_queries(queries)))
+        ranked_lists = self._run_fanout(
+            lambda query: self.vector_search(
+                table_name,
+                query,
+                settings,
+                urls=urls,
+                rerank=False,
+                query_vec=query_vecs[query],
+            ),
+            queries,
+            wait_for_late=True,
+        )
+
+        records = {
+            record["doc_id"]: record for ranked in ranked_lists for record in ranked
+        }
+        fused_ids = _fuse_rankings(
+            [
+                np.array([record["doc_id"] for record in ranked], dtype=np.int64)
+                for ranked in ranked_lists
+            ],
+            [np.zeros(len(ranked)) for ranked in ranked_lists],
+            [1.0] * len(ranked_lists),
+            "rrf",
+        )
+        self.logger.info(
+            f"✅ Fused the chunks of {len(ranked_lists)} of {len(queries)} queries."
+        )
+        return self._rerank_chunks(
+            queries[0], [records[doc_id] for doc_id in fused_ids], settings.top_k
+        )
 
-        search_results_dict = json.loads(resp.text)
+    def _search_page(
+        self, query: str, settings: AskSettings, start: int
+    ) -> Tuple[List[str], int]:
+        """
+        Return the links of the result page at the start offset and the total number
+        of results of the query.
+        """
+        # the response depends on the engine, the query, the settings and the offset
+        cache_key = json.dumps(
+            [
+                self.search_api_url,
+                self.search_project_id,
+                query,
+                settings.date_restrict,
+                settings.target_site,
+                start,
+            ]
+        )
+        resp_text = None
+        cached = False
+        if self.search_cache is not None:
+            value = self.search_cache.get(cache_key)
+            if value is not None:
+                cached_response = json.loads(value.decode("utf-8"))
+                if time.time() - cached_response["fetched_at"] < self.search_cache_ttl:
+                    self.logger.info(f"✅ Using the cached search results at {start}.")
+                    resp_text = cached_response["response"]
+                    cached = True
+
+        if resp_text is None:
+            resp_text = self._fetch_search_page(query, settings, start)
+
+        search_results_dict = json.loads(resp_text)
         if "error" in search_results_dict:
             raise Exception(
                 f"Error in search API response: {search_results_dict['error']}"
             )
 
         if "searchInformation" not in search_results_dict:
-            raise Exception(
-                f"No search information in search API response: {resp.text}"
-            )
+            raise Exception(f"No search information in search API response: {resp_text}")
+
+        if self.search_cache is not None and not cached:
+            cached_response = {"response": resp_text, "fetched_at": time.time()}
+            self.search_cache.put(cache_key, json.dumps(cached_response).encode("utf-8"))
 
-        total_results = search_results_dict["searchInformation"].get("totalResults", 0)
+        # the Google API returns the total as a string
+        total_results = int(
+            search_results_dict["searchInformation"].get("totalResults", 0)
+        )
         if total_results == 0:
-            self.logger.warning(f"No results found for query: {query}")
-            return []
+            if start == 1:
+                self.logger.warning(f"No results found for query: {query}")
+            return [], 0
 
         results = search_results_dict.get("items", [])
         if results is None or len(results) == 0:
-            self.logger.warning(f"No result items in the response for query: {query}")
-            return []
+            if start == 1:
+                self.logger.warning(
+                    f"No result items in the response for query: {query}"
+                )
+            return [], total_results
 
         found_links = []
         for result in results:
@@ -256,51 +2124,270 @@ class Ask:
                 self.logger.warning(f"Search result link missing: {result}")
                 continue
             found_links.append(link)
-        return found_links
+        return found_links, total_results
+
+    def _fetch_search_page(self, query: str, settings: AskSettings, start: int) -> str:
+        escaped_query = urllib.parse.quote(query)
+        url_base = (
+            f"{self.search_api_url}?key={self.search_api_key}"
+            f"&cx={self.search_project_id}&q={escaped_query}"
+        )
+        url_paras = f"&safe=active"
+        if settings.date_restrict > 0:
+            url_paras += f"&dateRestrict={settings.date_restrict}"
+        if settings.target_site:
+            url_paras += f"&siteSearch={settings.target_site}&siteSearchFilter=i"
+        if start > 1:
+            url_paras += f"&start={start}"
+        url = f"{url_base}{url_paras}"
+
+        self.logger.debug(f"Searching for query: {query}")
+
+        resp = self.http_client.get(url, polite=False)
+
+        if resp is None:
+            raise Exception("No response from search API")
+        return resp.text
+
+    def _get_cached_page(self, url: str) -> Optional[Dict[str, Any]]:
+        if self.scrape_cache is None:
+            return None
+        value = self.scrape_cache.get(url)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def _save_page_to_cache(
+        self, url: str, body_text: str, response: httpx.Response
+    ) -> None:
+        # the error pages are not cached, the next query fetches the page again
+        if self.scrape_cache is None or response.status_code != 200:
+            return
+        cached_page = {
+            "body_text": body_text,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        }
+        self.scrape_cache.put(url, json.dumps(cached_page).encode("utf-8"))
+
+    def _extract_text(self, url: str, content: bytes) -> Optional[str]:
+        parse_pool = self._get_parse_pool_for(content)
+        if parse_pool is None:
+            parse_result = _extract_page_text(self.html_text_extractor, content)
+        else:
+            parse_result = parse_pool.submit(
+                _extract_page_text, self.html_text_extractor, content
+            ).result()
+        body_text, _, error = parse_result
+        if error:
+            self.logger.warning(
+                f"Text extraction failed for {url}: {error}, falling back to BeautifulSoup."
+            )
+        return body_text
+
+    def _fetch_url(self, url: str) -> Tuple[str, Optional[str], Optional[httpx.Response]]:
+        """
+        The I/O stage of the scraping. Returns the URL with either the body text of
+        the page from the cache, or the response that still needs to be parsed.
+        Both are None if the fetch failed or the server returned an error.
+        """
+        cached_page = self._get_cached_page(url)
+        if cached_page is not None:
+            age = time.time() - cached_page["fetched_at"]
+            if age < self.scrape_cache_ttl:
+                self.logger.info(f"✅ Using the cached page of {url}.")
+                return url, cached_page["body_text"], None
 
-    def _scape_url(self, url: str) -> Tuple[str, str]:
         self.logger.info(f"Scraping {url} ...")
         try:
-            response = self.session.get(url, timeout=10)
-            soup = BeautifulSoup(response.content, "lxml", from_encoding="utf-8")
-
-            body_tag = soup.body
-            if body_tag:
-                body_text = body_tag.get_text()
-                body_text = " ".join(body_text.split()).strip()
-                self.logger.debug(f"Scraped {url}: {body_text}...")
-                if len(body_text) > 100:
-                    self.logger.info(
-                        f"✅ Successfully scraped {url} with length: {len(body_text)}"
-                    )
-                    return url, body_text
-                else:
-                    self.logger.warning(
-                        f"Body text too short for url: {url}, length: {len(body_text)}"
-                    )
-                    return url, ""
-            else:
-                self.logger.warning(f"No body tag found in the response for url: {url}")
-                return url, ""
+            # revalidate the expired cached page with a conditional GET
+            headers = {}
+            if cached_page is not None:
+                if cached_page["etag"]:
+                    headers["If-None-Match"] = cached_page["etag"]
+                if cached_page["last_modified"]:
+                    headers["If-Modified-Since"] = cached_page["last_modified"]
+
+            response = self.http_client.get(url, headers=headers)
+            if response.status_code == 304 and cached_page is not None:
+                self.logger.info(f"✅ Page not modified since cached: {url}")
+                cached_page["fetched_at"] = time.time()
+                self.scrape_cache.put(url, json.dumps(cached_page).encode("utf-8"))
+                return url, cached_page["body_text"], None
+            if response.status_code != 200:
+                self.logger.warning(
+                    f"Scraping {url} failed with HTTP status {response.status_code}."
+                )
+                return url, None, None
+            return url, None, response
         except Exception as e:
             self.logger.error(f"Scraping error {url}: {e}")
+            return url, None, None
+
+    def _finish_scrape(
+        self, url: str, body_text: Optional[str], response: httpx.Response
+    ) -> Tuple[str, str]:
+        if body_text is None:
+            self.logger.warning(f"No body tag found in the response for url: {url}")
             return url, ""
 
+        self.logger.debug(f"Scraped {url}: {body_text}...")
+        if len(body_text) > 100:
+            self.logger.info(
+                f"✅ Successfully scraped {url} with length: {len(body_text)}"
+            )
+            self._save_page_to_cache(url, body_text, response)
+            return url, body_text
+        else:
+            self.logger.warning(
+                f"Body text too short for url: {url}, length: {len(body_text)}"
+            )
+            return url, ""
+
+    def _scape_url(self, url: str) -> Tuple[str, str]:
+        # the URL being scraped by a concurrent query is not scraped again
+        own_urls, shared_futures = self._scrape_flight.claim([url])
+        if len(own_urls) == 0:
+            return url, shared_futures[url].result()
+
+        body_text = ""
+        try:
+            body_text = self._scrape_own_url(url)
+        finally:
+            self._scrape_flight.resolve(url, body_text)
+        return url, body_text
+
+    def _scrape_own_url(self, url: str) -> str:
+        url, cached_text, response = self._fetch_url(url)
+        if cached_text is not None:
+            return cached_text
+        if response is None:
+            return ""
+
+        try:
+            body_text = self._extract_text(url, response.content)
+            return self._finish_scrape(url, body_text, response)[1]
+        except Exception as e:
+            self.logger.error(f"Scraping error {url}: {e}")
+            return ""
+
+    def _get_parse_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.scrape_parse_workers <= 0:
+            return None
+        if self._parse_pool is None:
+            # spawn since the process has threads running, e.g., GradIO
+            self._parse_pool = ProcessPoolExecutor(
+                max_workers=self.scrape_parse_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._parse_pool
+
+    def _get_parse_pool_for(self, content: bytes) -> Optional[ProcessPoolExecutor]:
+        # sending a small page to another process costs more than parsing it
+        if len(content) < self.scrape_parse_min_bytes:
+            return None
+        return self._get_parse_pool()
+
     def scrape_urls(self, urls: List[str]) -> Dict[str, str]:
+        """
+        Fetch the pages in threads and parse the large pages in the parse processes.
+        """
         # the key is the url and the value is the body text
         scrape_results: Dict[str, str] = {}
+        body_texts: Dict[str, str] = {}
 
-        partial_scrape = partial(self._scape_url)
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            results = executor.map(partial_scrape, urls)
+        own_urls, shared_futures = self._scrape_flight.claim(urls)
+        try:
+            self._scrape_own_urls(own_urls, body_texts)
+        finally:
+            for url in own_urls:
+                self._scrape_flight.resolve(url, body_texts.get(url, ""))
 
-        for url, body_text in results:
+        if len(shared_futures) > 0:
+            self.logger.info(
+                f"Waiting for {len(shared_futures)} URLs scraped by other queries ..."
+            )
+            for url, future in shared_futures.items():
+                body_texts[url] = future.result()
+
+        for url in urls:
+            body_text = body_texts.get(url, "")
             if body_text != "":
                 scrape_results[url] = body_text
 
+        if self.scrape_cache is not None:
+            self.logger.info(f"Scrape cache: {self.scrape_cache.stats_str()}.")
         return scrape_results
 
-    def chunk_results(self, scrape_results: Dict[str, str]) -> Dict[str, List[Chunk]]:
+    def _scrape_own_urls(self, urls: List[str], body_texts: Dict[str, str]) -> None:
+        start_time = time.perf_counter()
+        fetch_seconds = 0.0
+        parse_cpu_seconds = 0.0
+        fetched_bytes = 0
+        parsed_count = 0
+        parse_futures: Dict[Future, Tuple[str, httpx.Response]] = {}
+
+        def finish_parse(url: str, response: httpx.Response, parse_result) -> None:
+            nonlocal parse_cpu_seconds, parsed_count
+            body_text, parse_seconds, error = parse_result
+            if error:
+                self.logger.warning(
+                    f"Text extraction failed for {url}: {error}, "
+                    "falling back to BeautifulSoup."
+                )
+            parse_cpu_seconds += parse_seconds
+            parsed_count += 1
+            body_texts[url] = self._finish_scrape(url, body_text, response)[1]
+
+        # the HTTP client enforces the global and per-host limits
+        with ThreadPoolExecutor(max_workers=self.scrape_concurrency) as executor:
+            fetch_futures = [
+                _submit_in_context(executor, self._fetch_url, url) for url in urls
+            ]
+            for future in as_completed(fetch_futures):
+                url, cached_text, response = future.result()
+                if cached_text is not None:
+                    body_texts[url] = cached_text
+                elif response is not None:
+                    fetched_bytes += len(response.content)
+                    parse_pool = self._get_parse_pool_for(response.content)
+                    if parse_pool is None:
+                        try:
+                            parse_result = _extract_page_text(
+                                self.html_text_extractor, response.content
+                            )
+                        except Exception as e:
+                            self.logger.error(f"Scraping error {url}: {e}")
+                            continue
+                        finish_parse(url, response, parse_result)
+                    else:
+                        parse_future = parse_pool.submit(
+                            _extract_page_text,
+                            self.html_text_extractor,
+                            response.content,
+                        )
+                        parse_futures[parse_future] = (url, response)
+            fetch_seconds = time.perf_counter() - start_time
+
+        for parse_future in as_completed(parse_futures):
+            url, response = parse_futures[parse_future]
+            try:
+                parse_result = parse_future.result()
+            except Exception as e:
+                self.logger.error(f"Scraping error {url}: {e}")
+                continue
+            finish_parse(url, response, parse_result)
+        total_seconds = time.perf_counter() - start_time
+
+        self.logger.info(
+            f"Scrape stages: fetched {len(urls)} URLs ({fetched_bytes / 1024:.0f} KB) "
+            f"in {fetch_seconds:.2f}s, parsed {parsed_count} pages with "
+            f"{parse_cpu_seconds:.2f}s CPU ({len(parse_futures)} in the process pool), "
+            f"total {total_seconds:.2f}s."
+        )
+
+    def chunk_results(self, scrape_results: Dict[str, str]) -> Dict[str, List["Chunk"]]:
         chunking_results: Dict[str, List[str]] = {}
         for url, text in scrape_results.items():
             chunking_results[url] = self.chunker.chunk(text)
@@ -316,190 +2403,750 @@ class Ask:
             embeddings.append(response.data[i].embedding)
         return embeddings
 
-    def batch_get_embedding(
-        self, client: OpenAI, chunk_batch: Tuple[str, List[str]]
-    ) -> Tuple[Tuple[str, List[str]], List[List[float]]]:
+    def _embed_texts_with_api(self, texts: List[str]) -> List[List[float]]:
+        return self.get_embedding(self._embed_batch_api_client, texts)
+
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Return the embeddings of the texts as a float32 matrix.
+        """
+        if len(texts) == 0:
+            return np.zeros((0, int(self.embedding_dimensions)), dtype=np.float32)
+        if self.local_embedding:
+            return self.local_embedding_model.embed(texts)
+        return np.asarray(self.embedding_batcher.embed(texts), dtype=np.float32)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return self.embed_queries([query])[0]
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Return the embeddings of the queries as a float32 matrix in one request.
         """
-        Return the chunk_batch as well as the embeddings for each chunk so that
-        we can aggregate them and save them to the database together.
+        if self.local_embedding:
+            return self.local_embedding_model.embed(queries)
+        # not queued behind the chunks in the batcher
+        embed_client = self._get_embed_api_client()
+        embeddings = self.get_embedding(embed_client, queries)
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def _embedding_cache_key(self, text: str) -> str:
+        return (
+            f"{self.embedding_model}:{self.embedding_dimensions}:{_content_hash(text)}"
+        )
+
+    def _get_cached_embeddings(self, texts: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Return the cached embeddings for the texts, keyed by the embedding cache key.
+        """
+        if self.embedding_cache is None or len(texts) == 0:
+            return {}
+
+        keys = [self._embedding_cache_key(text) for text in texts]
+        cached = self.embedding_cache.get_many(keys)
+        return {
+            key: np.frombuffer(value, dtype=np.float32)
+            for key, value in cached.items()
+        }
+
+    def _save_embeddings_to_cache(
+        self, texts: List[str], embeddings: np.ndarray
+    ) -> None:
+        if self.embedding_cache is None:
+            return
+
+        self.embedding_cache.put_many(
+            {
+                self._embedding_cache_key(text): np.asarray(
+                    embedding, dtype=np.float32
+                ).tobytes()
+                for text, embedding in zip(texts, embeddings)
+            }
+        )
+
+    def run_pipeline(
+        self, sources: List[str], fetch_fn: Callable[[str], Tuple[str, str]]
+    ) -> Tuple[Dict[str, str], Dict[str, List["Chunk"]], Dict[str, np.ndarray]]:
+        """
+        Fetch, chunk and embed the sources with overlapped stages, each document is
+        chunked as soon as it is fetched.
 
         Args:
-        - client: OpenAI client
-        - chunk_batch: Tuple of URL and list of chunks scraped from the URL
+        - sources: the URLs or file paths to process
+        - fetch_fn: returns the URI and the text of a source, or "" if failed
 
         Returns:
-        - Tuple of chunk_bach and list of result embeddings
+        - the fetched documents keyed by URI
+        - the chunks of the new documents keyed by URI
+        - the embeddings of the chunks keyed by the embedding cache key
         """
-        texts = chunk_batch[1]
-        embeddings = self.get_embedding(client, texts)
-        return chunk_batch, embeddings
+        return asyncio.run(self._run_pipeline_async(sources, fetch_fn))
+
+    async def _run_pipeline_async(
+        self, sources: List[str], fetch_fn: Callable[[str], Tuple[str, str]]
+    ) -> Tuple[Dict[str, str], Dict[str, List["Chunk"]], Dict[str, np.ndarray]]:
+        fetch_semaphore = asyncio.Semaphore(self.pipeline_fetch_concurrency)
+        chunk_semaphore = asyncio.Semaphore(self.pipeline_chunk_concurrency)
+        embed_semaphore = asyncio.Semaphore(self.pipeline_embed_concurrency)
+
+        fetched: Dict[str, Tuple[str, str]] = {}
+        chunked: Dict[str, List["Chunk"]] = {}
+        embeddings_by_key: Dict[str, np.ndarray] = {}
+        # the chunks of the documents waiting for the embed stage
+        pending_chunks: Dict[str, List["Chunk"]] = {}
+        embed_tasks: List[asyncio.Task] = []
+        start_time = time.perf_counter()
+
+        async def embed_pending() -> None:
+            # embed the chunks of all the documents waiting in one call
+            async with embed_semaphore:
+                if len(pending_chunks) == 0:
+                    return
+                batch = dict(pending_chunks)
+                pending_chunks.clear()
+                embeddings = await asyncio.to_thread(self._embed_chunks, batch)
+            embeddings_by_key.update(embeddings)
+            self.logger.info(
+                f"✅ Embedded {sum(len(chunks) for chunks in batch.values())} chunks "
+                f"from {len(batch)} documents after "
+                f"{time.perf_counter() - start_time:.2f}s."
+            )
+
+        async def process(source: str) -> None:
+            async with fetch_semaphore:
+                uri, text = await asyncio.to_thread(fetch_fn, source)
+            if text == "":
+                return
+            fetched[source] = (uri, text)
+
+            # may wait for the DB lock
+            new_documents = await asyncio.to_thread(
+                self.filter_new_documents, {uri: text}
+            )
+            if len(new_documents) == 0:
+                return
+
+            async with chunk_semaphore:
+                chunks = await asyncio.to_thread(self.chunker.chunk, text)
+            chunked[source] = chunks
+
+            pending_chunks[uri] = chunks
+            embed_tasks.append(asyncio.create_task(embed_pending()))
+
+        await asyncio.gather(*[process(source) for source in sources])
+        await asyncio.gather(*embed_tasks)
+
+        # keep the order of the sources
+        target_documents: Dict[str, str] = {}
+        all_chunks: Dict[str, List["Chunk"]] = {}
+        for source in sources:
+            if source not in fetched:
+                continue
+            uri, text = fetched[source]
+            target_documents[uri] = text
+            if source in chunked:
+                all_chunks[uri] = chunked[source]
+
+        self.logger.info(
+            f"✅ Pipeline processed {len(target_documents)} documents in "
+            f"{time.perf_counter() - start_time:.2f}s."
+        )
+        return target_documents, all_chunks, embeddings_by_key
 
     def _create_table(self) -> str:
         # Simple ways to get a unique table name
         timestamp = datetime.now().strftime("%Y_%m_%d_%H_%M_%S_%f")
-        table_name = f"document_chunks_{timestamp}"
+        # the concurrent queries may start in the same microsecond
+        table_name = f"document_chunks_{timestamp}_{uuid.uuid4().hex[:8]}"
+
+        self.db_cursor.execute(
+            f"""
+    CREATE TABLE {table_name} (
+        doc_id INTEGER PRIMARY KEY DEFAULT nextval('seq_docid'),
+        url TEXT,
+        content_hash TEXT,
+        chunk TEXT,
+        vec FLOAT[{self.embedding_dimensions}]
+    );
+    """
+        )
+        return table_name
+
+    def drop_table(self, table_name: str) -> None:
+        """
+        Drop a per-query table and its indexes, never a persistent table.
+        """
+        if table_name in (corpus_table_name, local_table_name):
+            return
+        db_cursor = self.db_cursor
+        if table_name in self.fts_stale_tables:
+            self.fts_stale_tables.discard(table_name)
+        else:
+            db_cursor.execute(f"PRAGMA drop_fts_index({table_name})")
+        db_cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+        db_cursor.execute(f"DROP TABLE IF EXISTS {table_name}_documents")
 
-        self.db_con.execute(
+    def _create_persistent_tables(
+        self, db_con: "duckdb.DuckDBPyConnection", table_name: str
+    ) -> None:
+        """
+        Create the chunk table and the table of the saved documents if not exist.
+        """
+        db_con.execute("SET hnsw_enable_experimental_persistence = true")
+        db_con.execute(
             f"""
-CREATE TABLE {table_name} (
+CREATE TABLE IF NOT EXISTS {table_name} (
     doc_id INTEGER PRIMARY KEY DEFAULT nextval('seq_docid'),
     url TEXT,
+    content_hash TEXT,
     chunk TEXT,
     vec FLOAT[{self.embedding_dimensions}]
 );
 """
         )
-        return table_name
+        db_con.execute(
+            f"""
+CREATE TABLE IF NOT EXISTS {table_name}_documents (
+    url TEXT PRIMARY KEY,
+    content_hash TEXT,
+    last_seen TIMESTAMP
+);
+"""
+        )
+        db_con.execute(
+            f"""
+                CREATE INDEX IF NOT EXISTS {table_name}_cos_idx
+                ON {table_name} USING HNSW (vec) WITH (metric = 'cosine');
+            """
+        )
+        fts_schema_count = db_con.execute(
+            "SELECT COUNT(*) FROM duckdb_schemas() WHERE schema_name = ?",
+            [f"fts_main_{table_name}"],
+        ).fetchall()[0][0]
+        if fts_schema_count == 0:
+            self.fts_stale_tables.add(table_name)
+
+    def ensure_persistent_tables(self, table_name: str) -> None:
+        with self._db_lock:
+            self._create_persistent_tables(self.db_cursor, table_name)
+
+    def get_document_urls(self, table_name: str) -> List[str]:
+        with self._db_lock:
+            rows = self.db_cursor.execute(
+                f"SELECT url FROM {table_name}_documents"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def filter_new_documents(
+        self, target_documents: Dict[str, str], table_name: Optional[str] = None
+    ) -> Dict[str, str]:
+        """
+        Return the documents that are new or changed in the persistent table, which
+        is the corpus by default, and mark the unchanged documents as seen.
+        """
+        if table_name is None:
+            if not self.corpus_db_file:
+                return target_documents
+            table_name = corpus_table_name
+
+        if len(target_documents) == 0:
+            return {}
+
+        urls = list(target_documents.keys())
+        with self._db_lock:
+            saved_hashes = dict(
+                self.db_cursor.execute(
+                    f"""
+                    SELECT url, content_hash FROM {table_name}_documents
+                    WHERE list_contains(?, url)
+                    """,
+                    [urls],
+                ).fetchall()
+            )
+            new_documents: Dict[str, str] = {}
+            unchanged_urls: List[str] = []
+            for url, text in target_documents.items():
+                if saved_hashes.get(url) == _content_hash(text):
+                    unchanged_urls.append(url)
+                else:
+                    new_documents[url] = text
+
+            if len(unchanged_urls) > 0:
+                self.db_cursor.execute(
+                    f"""
+                    UPDATE {table_name}_documents SET last_seen = now()
+                    WHERE list_contains(?, url)
+                    """,
+                    [unchanged_urls],
+                )
+        self.logger.info(
+            f"Table {table_name} has {len(unchanged_urls)} unchanged documents, "
+            f"{len(new_documents)} new or changed documents to add."
+        )
+        return new_documents
 
-    def save_chunks_to_db(self, all_chunks: Dict[str, List[Chunk]]) -> str:
+    def _embed_chunks(
+        self, all_chunks: Dict[str, List["Chunk"]]
+    ) -> Dict[str, np.ndarray]:
+        """
+        Return the embeddings of the chunks keyed by the embedding cache key.
+        """
+        all_texts = [chunk.text for chunks in all_chunks.values() for chunk in chunks]
+        all_keys = [self._embedding_cache_key(text) for text in all_texts]
+        cached_embeddings = self._get_cached_embeddings(all_texts)
+
+        uncached_keys = [key for key in all_keys if key not in cached_embeddings]
+        own_keys, shared_futures = self._embed_flight.claim(uncached_keys)
+        own_key_set = set(own_keys)
+        own_texts: List[str] = []
+        own_text_keys: List[str] = []
+        for text, key in zip(all_texts, all_keys):
+            if key in own_key_set:
+                own_texts.append(text)
+                own_text_keys.append(key)
+                own_key_set.remove(key)
+
+        embeddings_by_key = dict(cached_embeddings)
+        try:
+            self.logger.info(f"Embedding {len(own_texts)} chunks ...")
+            start_time = time.perf_counter()
+            embeddings = self.embed_texts(own_texts)
+            elapsed = time.perf_counter() - start_time
+            if self.local_embedding:
+                self.logger.info(f"✅ Finished embedding in {elapsed:.2f}s.")
+            else:
+                self.logger.info(
+                    f"✅ Finished embedding in {elapsed:.2f}s "
+                    f"({self.embedding_batcher.stats_str()})."
+                )
+
+            self._save_embeddings_to_cache(own_texts, embeddings)
+            for key, embedding in zip(own_text_keys, embeddings):
+                embeddings_by_key[key] = embedding
+                self._embed_flight.resolve(key, embedding)
+        finally:
+            for key in own_keys:
+                self._embed_flight.fail(key, Exception("Failed to embed the chunk."))
+
+        if len(shared_futures) > 0:
+            self.logger.info(
+                f"Waiting for {len(shared_futures)} chunks embedded by other queries."
+            )
+            for key, future in shared_futures.items():
+                embeddings_by_key[key] = future.result()
+
+        if self.embedding_cache is not None:
+            self.logger.info(
+                f"Embedding cache: {len(cached_embeddings)} of {len(all_texts)} chunks "
+                f"found in cache ({self.embedding_cache.stats_str()})."
+            )
+        return embeddings_by_key
+
+    def save_chunks_to_db(
+        self,
+        all_chunks: Dict[str, List["Chunk"]],
+        content_hashes: Optional[Dict[str, str]] = None,
+        embeddings_by_key: Optional[Dict[str, np.ndarray]] = None,
+        fts_index: bool = True,
+        table_name: Optional[str] = None,
+    ) -> str:
         """
         The key of chunking_results is the URL and the value is the list of chunks.
+
+        The chunks replace the saved chunks of the same URLs in the persistent table,
+        which is the corpus by default, otherwise a new table is created.
+        If fts_index is False, the full text search index of a new table is not built
+        until the next hybrid search on the table.
         """
-        embed_client = self._get_embed_api_client()
-        embed_batch_size = 50
-        query_batch_size = 100
-        insert_data = []
+        if content_hashes is None:
+            content_hashes = {}
+
+        if table_name is None and self.corpus_db_file:
+            table_name = corpus_table_name
+        persistent = table_name is not None
+        if not persistent:
+            table_name = self._create_table()
 
-        table_name = self._create_table()
+        if embeddings_by_key is None:
+            embeddings_by_key = self._embed_chunks(all_chunks)
 
-        batches: List[Tuple[str, List[str]]] = []
+        urls: List[str] = []
+        chunk_hashes: List[str] = []
+        texts: List[str] = []
         for url, list_chunks in all_chunks.items():
-            for i in range(0, len(list_chunks), embed_batch_size):
-                batch = [chunk.text for chunk in list_chunks[i : i + embed_batch_size]]
-                batches.append((url, batch))
-
-        self.logger.info(f"Embedding {len(batches)} batches of chunks ...")
-        partial_get_embedding = partial(self.batch_get_embedding, embed_client)
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            all_embeddings = executor.map(partial_get_embedding, batches)
-        self.logger.info(f"✅ Finished embedding.")
-
-        # We batch the insert data to speed up the insertion operation.
-        # Although the DuckDB doc says executeMany is optimized for batch insert,
-        # we found that it is faster to batch the insert data and run a single insert.
-        for chunk_batch, embeddings in all_embeddings:
-            url = chunk_batch[0]
-            list_chunks = chunk_batch[1]
-            insert_data.extend(
-                [
-                    (url.replace("'", " "), chunk.replace("'", " "), embedding)
-                    for chunk, embedding in zip(list_chunks, embeddings)
-                ]
+            urls.extend([url] * len(list_chunks))
+            chunk_hashes.extend([content_hashes.get(url, "")] * len(list_chunks))
+            texts.extend([chunk.text for chunk in list_chunks])
+
+        if len(texts) > 0:
+            embeddings = np.stack(
+                [embeddings_by_key[self._embedding_cache_key(text)] for text in texts]
             )
+        else:
+            embeddings = np.zeros((0, int(self.embedding_dimensions)), dtype=np.float32)
+
+        # a per-query table is only written by the query that created it
+        with self._db_lock if persistent else nullcontext():
+            deleted_count = 0
+            if persistent and len(all_chunks) > 0:
+                deleted_count = self.db_cursor.execute(
+                    f"DELETE FROM {table_name} WHERE list_contains(?, url)",
+                    [list(all_chunks.keys())],
+                ).fetchall()[0][0]
+                self.db_cursor.executemany(
+                    f"""
+                    INSERT OR REPLACE INTO {table_name}_documents
+                    (url, content_hash, last_seen) VALUES (?, ?, now())
+                    """,
+                    [(url, content_hashes.get(url, "")) for url in all_chunks.keys()],
+                )
 
-        for i in range(0, len(insert_data), query_batch_size):
-            value_str = ", ".join(
-                [
-                    f"('{url}', '{chunk}', {embedding})"
-                    for url, chunk, embedding in insert_data[i : i + embed_batch_size]
-                ]
+            _insert_chunk_batch(
+                self.db_cursor, table_name, urls, chunk_hashes, texts, embeddings
             )
-            query = f"""
-            INSERT INTO {table_name} (url, chunk, vec) VALUES {value_str};
-            """
-            self.db_con.execute(query)
 
-        self.db_con.execute(
-            f"""
+            if persistent:
+                # the full text search index is rebuilt later
+                if len(all_chunks) > 0:
+                    self._mark_fts_changed(table_name, deleted_count + len(texts))
+                return table_name
+
+            self.db_cursor.execute(
+                f"""
                 CREATE INDEX {table_name}_cos_idx ON {table_name} USING HNSW (vec)
                 WITH (metric = 'cosine');
             """
+            )
+            self.logger.info(f"✅ Created the vector index ...")
+            self._update_fts_index(table_name, fts_index)
+            return table_name
+
+    def _update_fts_index(self, table_name: str, rebuild: bool) -> None:
+        if rebuild:
+            self._create_fts_index(table_name)
+        else:
+            self.fts_stale_tables.add(table_name)
+
+    def _mark_fts_changed(self, table_name: str, change_count: int) -> None:
+        if table_name in self.fts_stale_tables:
+            return
+        pending_count, first_change_time = self.fts_pending_changes.get(
+            table_name, (0, time.time())
+        )
+        self.fts_pending_changes[table_name] = (
+            pending_count + change_count,
+            first_change_time,
         )
-        self.logger.info(f"✅ Created the vector index ...")
-        self.db_con.execute(
+
+    def _fts_index_needs_rebuild(self, table_name: str) -> bool:
+        """
+        A missing index is always built, an out of date index of a persistent table
+        is rebuilt after enough chunks have changed or the oldest change is too old.
+        """
+        if table_name in self.fts_stale_tables:
+            return True
+        if table_name not in self.fts_pending_changes:
+            return False
+        pending_count, first_change_time = self.fts_pending_changes[table_name]
+        return (
+            pending_count >= self.fts_rebuild_min_changes
+            or time.time() - first_change_time >= self.fts_rebuild_max_age
+        )
+
+    def _create_fts_index(self, table_name: str) -> None:
+        self._load_fts_extension()
+        self.db_cursor.execute(
             f"""
                 PRAGMA create_fts_index(
-                {table_name}, 'doc_id', 'chunk'
-                );    
+                {table_name}, 'doc_id', 'chunk', overwrite = 1
+                );
             """
         )
+        self.fts_stale_tables.discard(table_name)
+        self.fts_pending_changes.pop(table_name, None)
         self.logger.info(f"✅ Created the full text search index ...")
-        return table_name
+
+    def delete_documents(self, table_name: str, urls: List[str]) -> None:
+        """
+        Delete the documents and their chunks from a persistent table.
+        """
+        if len(urls) == 0:
+            return
+
+        with self._db_lock:
+            deleted_count = self.db_cursor.execute(
+                f"DELETE FROM {table_name} WHERE list_contains(?, url)", [urls]
+            ).fetchall()[0][0]
+            self.db_cursor.execute(
+                f"DELETE FROM {table_name}_documents WHERE list_contains(?, url)",
+                [urls],
+            )
+            self._mark_fts_changed(table_name, deleted_count)
+
+    def compact_corpus(self) -> None:
+        """
+        Evict the documents not seen in corpus_max_age_days days and reclaim the space.
+        """
+        if not self.corpus_db_file:
+            return
+
+        self.logger.info("Compacting the corpus ...")
+        cutoff = datetime.now() - timedelta(days=self.corpus_max_age_days)
+        with self._db_lock:
+            stale_urls = [
+                row[0]
+                for row in self.db_cursor.execute(
+                    f"SELECT url FROM {corpus_table_name}_documents WHERE last_seen < ?",
+                    [cutoff],
+                ).fetchall()
+            ]
+            self.delete_documents(corpus_table_name, stale_urls)
+            # a missing index is left to the next hybrid search
+            if corpus_table_name in self.fts_pending_changes:
+                self._create_fts_index(corpus_table_name)
+            self.db_cursor.execute(
+                f"PRAGMA hnsw_compact_index('{corpus_table_name}_cos_idx')"
+            )
+            self.db_cursor.execute("CHECKPOINT")
+        self.logger.info(
+            f"✅ Compacted the corpus, evicted {len(stale_urls)} stale documents."
+        )
+
+    def maybe_compact_corpus(self) -> None:
+        """
+        Compact the corpus in a background thread every corpus_compact_interval queries.
+        """
+        if not self.corpus_db_file or self.corpus_compact_interval <= 0:
+            return
+
+        with self._init_lock:
+            self.corpus_query_count += 1
+            if self.corpus_query_count % self.corpus_compact_interval != 0:
+                return
+            if self._compact_executor is None:
+                self._compact_executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="compact"
+                )
+
+        def compact() -> None:
+            try:
+                self.compact_corpus()
+            except Exception as e:
+                self.logger.error(f"Failed to compact the corpus: {e}")
+
+        self._compact_executor.submit(compact)
 
     def vector_search(
-        self, table_name: str, query: str, settings: AskSettings
+        self,
+        table_name: str,
+        query: str,
+        settings: AskSettings,
+        urls: Optional[List[str]] = None,
+        rerank: bool = True,
+        query_vec: Optional[np.ndarray] = None,
     ) -> List[Dict[str, Any]]:
-        import duckdb
-
         """
-        The return value is a list of {url: str, chunk: str} records.
+        The return value is a list of {doc_id: int, url: str, chunk: str} records.
         In a real world, we will define a class of Chunk to have more metadata such as offsets.
-        """
-        embed_client = self._get_embed_api_client()
-        embeddings = self.get_embedding(embed_client, [query])[0]
 
-        query_result: duckdb.DuckDBPyRelation = self.db_con.sql(
-            f"""
-            SELECT * FROM {table_name} 
-            ORDER BY array_distance(vec, {embeddings}::FLOAT[{self.embedding_dimensions}]) 
-            LIMIT 10;         
+        If urls is specified, only the chunks from these URLs are searched.
+        If rerank is False, all the fused candidates are returned for the caller to
+        rerank. If query_vec is specified, it is the embedding of the query.
         """
+        import duckdb
+
+        if query_vec is None:
+            query_vec = self.embed_query(query)
+
+        # more candidates are only useful if they are fused or reranked
+        candidate_count = int(settings.top_k)
+        if settings.hybrid_search or self.rerank_model_name or not rerank:
+            candidate_count = max(candidate_count, self.retrieval_candidates)
+
+        url_params = []
+        if urls is not None:
+            url_params = [urls]
+
+        # The HNSW index is created with the cosine metric, so we need to order by
+        # the cosine distance alias for DuckDB to use the index.
+        distance_column = (
+            f"array_cosine_distance(vec, ?::FLOAT[{self.embedding_dimensions}]) "
+            "AS distance"
+        )
+        if urls is None:
+            vector_query = f"""
+                SELECT doc_id, url, chunk, {distance_column}
+                FROM {table_name}
+                ORDER BY distance
+                LIMIT {candidate_count};
+            """
+        else:
+            # the few chunks of the URLs are scanned faster than the index, see
+            # scripts/bench_vector_search.py, and sorted here since with ORDER BY
+            # and LIMIT the index scan would run before the URL filter
+            vector_query = f"""
+                SELECT doc_id, url, chunk, {distance_column}
+                FROM {table_name}
+                WHERE list_contains(?, url);
+            """
+        vector_params = [query_vec] + url_params
+        if urls is None and not self.vector_index_checked:
+            with self._db_lock:
+                if not self.vector_index_checked:
+                    self._check_vector_index_usage(vector_query, vector_params)
+
+        # no lock, the concurrent queries search in parallel
+        db_cursor = self.db_cursor
+        query_result: duckdb.DuckDBPyRelation = db_cursor.execute(
+            vector_query, vector_params
         )
 
         self.logger.debug(query_result)
 
-        # use a dict to remove duplicates from vector search and full-text search
-        matched_chunks_dict = {}
-        for vec_result in query_result.fetchall():
-            doc_id = vec_result[0]
-            result_record = {
-                "url": vec_result[1],
-                "chunk": vec_result[2],
-            }
-            matched_chunks_dict[doc_id] = result_record
+        records: Dict[int, Dict[str, Any]] = {}
+        vec_rows = query_result.fetchall()
+        if urls is not None:
+            vec_rows = sorted(vec_rows, key=lambda row: row[3])[:candidate_count]
+        for doc_id, url, chunk, _ in vec_rows:
+            records[doc_id] = {"doc_id": doc_id, "url": url, "chunk": chunk}
+        ranked_ids = [np.array([row[0] for row in vec_rows], dtype=np.int64)]
+        # higher is better for the fusion
+        ranked_scores = [np.array([1.0 - row[3] for row in vec_rows], dtype=np.float64)]
+        weights = [self.fusion_vector_weight]
 
         if settings.hybrid_search:
             self.logger.info("Running full-text search ...")
 
-            self.db_con.execute(
-                f"""
-                PREPARE fts_query AS (
-                    WITH scored_docs AS (
-                        SELECT *, fts_main_{table_name}.match_bm25(
-                            doc_id, ?, fields := 'chunk'
-                        ) AS score FROM {table_name})
-                    SELECT doc_id, url, chunk, score
-                    FROM scored_docs
-                    WHERE score IS NOT NULL
-                    ORDER BY score DESC
-                    LIMIT 10)
-                """
-            )
-            self.db_con.execute("PRAGMA threads=4")
+            if self._fts_index_needs_rebuild(table_name):
+                with self._db_lock:
+                    if self._fts_index_needs_rebuild(table_name):
+                        self._create_fts_index(table_name)
+
+            fts_url_filter = ""
+            if urls is not None:
+                fts_url_filter = "AND list_contains(?, url)"
 
             # You can run more complex query rewrite methods here
             # usually: stemming, stop words, etc.
             escaped_query = query.replace("'", " ")
-            fts_result: duckdb.DuckDBPyRelation = self.db_con.execute(
-                f"EXECUTE fts_query('{escaped_query}')"
+            fts_result: duckdb.DuckDBPyRelation = db_cursor.execute(
+                f"""
+                WITH scored_docs AS (
+                    SELECT *, fts_main_{table_name}.match_bm25(
+                        doc_id, ?, fields := 'chunk'
+                    ) AS score FROM {table_name})
+                SELECT doc_id, url, chunk, score
+                FROM scored_docs
+                WHERE score IS NOT NULL {fts_url_filter}
+                ORDER BY score DESC
+                LIMIT {candidate_count}
+                """,
+                [escaped_query] + url_params,
             )
 
-            index = 0
-            for fts_record in fts_result.fetchall():
-                index += 1
-                self.logger.debug(f"The full text search record #{index}: {fts_record}")
-                doc_id = fts_record[0]
-                result_record = {
-                    "url": fts_record[1],
-                    "chunk": fts_record[2],
-                }
+            fts_rows = fts_result.fetchall()
+            for index, fts_record in enumerate(fts_rows):
+                self.logger.debug(
+                    f"The full text search record #{index + 1}: {fts_record}"
+                )
+                doc_id, url, chunk, _ = fts_record
+                records.setdefault(
+                    doc_id, {"doc_id": doc_id, "url": url, "chunk": chunk}
+                )
+            ranked_ids.append(np.array([row[0] for row in fts_rows], dtype=np.int64))
+            ranked_scores.append(
+                np.array([row[3] for row in fts_rows], dtype=np.float64)
+            )
+            weights.append(1.0 - self.fusion_vector_weight)
+
+        if len(ranked_ids) > 1:
+            # RRF ignores the scores, so both lists count the same
+            if self.fusion_method == "rrf":
+                weights = [1.0] * len(ranked_ids)
+            fused_ids = _fuse_rankings(
+                ranked_ids, ranked_scores, weights, self.fusion_method
+            )
+        else:
+            fused_ids = ranked_ids[0]
+        candidates = [records[doc_id] for doc_id in fused_ids.tolist()]
 
-                # You can configure the score threashold and top-k
-                if fts_record[3] > 1:
-                    matched_chunks_dict[doc_id] = result_record
-                else:
-                    break
+        if not rerank:
+            return candidates
+        return self._rerank_chunks(query, candidates, settings.top_k)
 
-                if index >= 10:
-                    break
+    def _rerank_chunks(
+        self, query: str, candidates: List[Dict[str, Any]], top_k: int
+    ) -> List[Dict[str, Any]]:
+        if not self.rerank_model_name or len(candidates) <= 1:
+            return candidates[:top_k]
+
+        start_time = time.perf_counter()
+        scores = self.rerank_model.score(query, [c["chunk"] for c in candidates])
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        self.logger.info(
+            f"✅ Reranked {len(candidates)} chunks in "
+            f"{time.perf_counter() - start_time:.2f}s."
+        )
+        return [candidates[i] for i in order.tolist()]
 
-        return matched_chunks_dict.values()
+    def _check_vector_index_usage(self, vector_query: str, params: List[Any]) -> None:
+        """
+        Check the query plan once to make sure the vector search uses the HNSW index.
+        """
+        plan_rows = self.db_cursor.execute(f"EXPLAIN {vector_query}", params).fetchall()
+        plan = "\n".join([row[-1] for row in plan_rows])
+        if "HNSW_INDEX_SCAN" in plan:
+            self.logger.info("✅ Vector search is using the HNSW index.")
+        else:
+            self.logger.warning(
+                "Vector search is not using the HNSW index, falling back to a full scan."
+            )
+            self.logger.debug(f"Vector search query plan:\n{plan}")
+        self.vector_index_checked = True
+
+    def init_api_clients(self) -> None:
+        """
+        Create the LLM and embedding API clients sharing one HTTP connection pool.
+        """
+        timeout = httpx.Timeout(self.llm_timeout, connect=self.llm_connect_timeout)
+        self.api_connection_stats = ConnectionStats()
+        self.api_http_client = openai.DefaultHttpxClient(
+            limits=httpx.Limits(
+                max_connections=self.llm_max_connections,
+                max_keepalive_connections=self.llm_max_keepalive_connections,
+                keepalive_expiry=self.llm_keepalive_expiry,
+            ),
+            timeout=timeout,
+            event_hooks={"request": [self.api_connection_stats.on_request]},
+        )
+        self.inference_api_client = OpenAI(
+            api_key=self.llm_api_key,
+            base_url=self.llm_base_url,
+            timeout=timeout,
+            http_client=self.api_http_client,
+        )
+        if (
+            self.embed_base_url == self.llm_base_url
+            and self.embed_api_key == self.llm_api_key
+        ):
+            self.embed_api_client = self.inference_api_client
+        else:
+            self.embed_api_client = OpenAI(
+                api_key=self.embed_api_key,
+                base_url=self.embed_base_url,
+                timeout=timeout,
+                http_client=self.api_http_client,
+            )
+        # the batcher handles the retries of the embedding requests
+        self._embed_batch_api_client = self.embed_api_client.with_options(
+            max_retries=0
+        )
 
     def _get_inference_api_client(self) -> OpenAI:
-        return OpenAI(api_key=self.llm_api_key, base_url=self.llm_base_url)
+        return self.inference_api_client
 
     def _get_embed_api_client(self) -> OpenAI:
-        return OpenAI(api_key=self.embed_api_key, base_url=self.embed_base_url)
+        return self.embed_api_client
 
     def _render_template(self, template_str: str, variables: Dict[str, Any]) -> str:
         env = Environment(loader=BaseLoader(), autoescape=False)
@@ -511,41 +3158,20 @@ CREATE TABLE {table_name} (
         exec(extract_schema_str, local_namespace, local_namespace)
         for key, value in local_namespace.items():
             if key == "__builtins__":
-                continue
-            if key == "BaseModel":
-                continue
-            if isinstance(value, type):
-                if issubclass(value, BaseModel):
-                    return value
-        raise Exception("No Pydantic schema found in the extract schema str.")
-
-    def run_inference(
-        self,
-        query: str,
-        matched_chunks: List[Dict[str, Any]],
-        settings: AskSettings,
-    ) -> str:
-        system_prompt = (
-            "You are an expert summarizing the answers based on the provided contents."
-        )
-        user_promt_template = """
-Given the context as a sequence of references with a reference id in the 
-format of a leading [x], please answer the following question using {{ language }}:
-
-{{ query }}
-
-In the answer, use format [1], [2], ..., [n] in line where the reference is used. 
-For example, "According to the research from Google[3], ...".
-
-Please create the answer strictly related to the context. If the context has no
-information about the query, please write "No related information found in the context."
-using {{ language }}.
-
-{{ length_instructions }}
+                continue
+            if key == "BaseModel":
+                continue
+            if isinstance(value, type):
+                if issubclass(value, BaseModel):
+                    return value
+        raise Exception("No Pydantic schema found in the extract schema str.")
 
-Here is the context:
-{{ context }}
-"""
+    def _build_inference_messages(
+        self,
+        query: str,
+        matched_chunks: List[Dict[str, Any]],
+        settings: AskSettings,
+    ) -> List[Dict[str, str]]:
         context = ""
         for i, chunk in enumerate(matched_chunks):
             context += f"[{i+1}] {chunk['chunk']}\n"
@@ -558,7 +3184,7 @@ Here is the context:
             )
 
         user_prompt = self._render_template(
-            user_promt_template,
+            answer_user_prompt_template,
             {
                 "query": query,
                 "context": context,
@@ -566,27 +3192,40 @@ Here is the context:
                 "length_instructions": length_instructions,
             },
         )
+        self.logger.debug(f"Final user prompt: {user_prompt}")
+
+        return [
+            {
+                "role": "system",
+                "content": answer_system_prompt,
+            },
+            {
+                "role": "user",
+                "content": user_prompt,
+            },
+        ]
 
+    def _get_final_inference_model(self, settings: AskSettings) -> str:
         final_inference_model = settings.inference_model_name
         if settings.inference_model_name is None:
             final_inference_model = self.default_inference_model
 
         self.logger.debug(f"Running inference with model: {final_inference_model}")
-        self.logger.debug(f"Final user prompt: {user_prompt}")
+        return final_inference_model
+
+    def run_inference(
+        self,
+        query: str,
+        matched_chunks: List[Dict[str, Any]],
+        settings: AskSettings,
+    ) -> str:
+        messages = self._build_inference_messages(query, matched_chunks, settings)
+        final_inference_model = self._get_final_inference_model(settings)
 
         api_client = self._get_inference_api_client()
         completion = api_client.chat.completions.create(
             model=final_inference_model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt,
-                },
-                {
-                    "role": "user",
-                    "content": user_prompt,
-                },
-            ],
+            messages=messages,
         )
         if completion is None:
             raise Exception("No completion from the API")
@@ -594,6 +3233,62 @@ Here is the context:
         response_str = completion.choices[0].message.content
         return response_str
 
+    def run_inference_stream(
+        self,
+        query: str,
+        matched_chunks: List[Dict[str, Any]],
+        settings: AskSettings,
+    ) -> Generator[str, None, None]:
+        """
+        Same as run_inference, but yields the answer tokens as they arrive.
+        """
+        messages = self._build_inference_messages(query, matched_chunks, settings)
+        final_inference_model = self._get_final_inference_model(settings)
+
+        api_client = self._get_inference_api_client()
+        start_time = time.perf_counter()
+        stream = api_client.chat.completions.create(
+            model=final_inference_model,
+            messages=messages,
+            stream=True,
+        )
+        if stream is None:
+            raise Exception("No completion from the API")
+
+        first_token_time = None
+        for chunk in stream:
+            if len(chunk.choices) == 0:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if first_token_time is None:
+                first_token_time = time.perf_counter()
+                self.logger.info(
+                    f"Time to first token: {first_token_time - start_time:.2f}s."
+                )
+            yield delta
+
+        self.logger.info(
+            f"Finished streaming the answer in {time.perf_counter() - start_time:.2f}s."
+        )
+
+    def split_for_extract(self, url: str, text: str) -> List[str]:
+        """
+        Split the document into parts if it does not fit the extraction token budget.
+        """
+        # a rough estimate of about 4 characters per token for English text
+        estimated_tokens = len(text) // 4
+        if estimated_tokens <= self.extract_max_tokens:
+            return [text]
+
+        parts = [chunk.text for chunk in self.extract_chunker.chunk(text)]
+        self.logger.info(
+            f"Split {url} with about {estimated_tokens} tokens into "
+            f"{len(parts)} parts for extraction."
+        )
+        return parts
+
     def run_extract(
         self,
         query: str,
@@ -602,20 +3297,8 @@ Here is the context:
         settings: AskSettings,
     ) -> List[TypeVar_BaseModel]:
         target_class = self._get_target_class(extract_schema_str)
-        system_prompt = (
-            "You are an expert of extract structual information from the document."
-        )
-        user_promt_template = """
-Given the provided content, if it contains information about {{ query }}, please extract the
-list of structured data items as defined in the following Pydantic schema:
-
-{{ extract_schema_str }}
-
-Below is the provided content:
-{{ content }}
-"""
         user_prompt = self._render_template(
-            user_promt_template,
+            extract_user_prompt_template,
             {
                 "query": query,
                 "content": target_content,
@@ -641,7 +3324,7 @@ Below is the provided content:
             messages=[
                 {
                     "role": "system",
-                    "content": system_prompt,
+                    "content": extract_system_prompt,
                 },
                 {
                     "role": "user",
@@ -662,6 +3345,87 @@ Below is the provided content:
         extract_result = message.parsed
         return extract_result.items
 
+    def _answer_cache_key(self, query: str, settings: AskSettings) -> str:
+        """
+        The key covers everything the answer depends on besides the retrieved context.
+        """
+        key_parts = {
+            "query": " ".join(query.lower().split()),
+            "settings": settings.model_dump(mode="json"),
+            "llm_base_url": self.llm_base_url,
+            "default_inference_model": self.default_inference_model,
+            "embed_base_url": self.embed_base_url,
+            "embedding_model": self.embedding_model,
+            "embedding_dimensions": self.embedding_dimensions,
+            "prompts": _content_hash(
+                answer_system_prompt
+                + answer_user_prompt_template
+                + extract_system_prompt
+                + extract_user_prompt_template
+            ),
+        }
+        if settings.input_mode == InputMode.local:
+            key_parts["data_dir"] = self.data_dir
+            key_parts["data_include"] = self.data_include
+            key_parts["data_exclude"] = self.data_exclude
+            key_parts["data_files"] = self._local_corpus_version()
+        return _content_hash(json.dumps(key_parts, sort_keys=True))
+
+    def _local_corpus_version(self) -> str:
+        # the hash of the path, size and mtime of all the files in the data folder
+        signatures = []
+        for file_path in self.list_data_files():
+            try:
+                signatures.append(self._conversion_cache_key(file_path))
+            except FileNotFoundError:
+                continue
+        return _content_hash("\n".join(sorted(signatures)))
+
+    def _get_cached_answer(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        if self.answer_cache is None:
+            return None
+        value = self.answer_cache.get(cache_key)
+        if value is None:
+            return None
+        return json.loads(value.decode("utf-8"))
+
+    def _save_answer_to_cache(
+        self, cache_key: str, result: str, retrieved_hash: str
+    ) -> None:
+        """
+        The retrieved_hash is the hash of the context the answer was generated from.
+        """
+        if self.answer_cache is None:
+            return
+        cached_answer = {
+            "result": result,
+            "retrieved_hash": retrieved_hash,
+            "created_at": time.time(),
+        }
+        self.answer_cache.put(cache_key, json.dumps(cached_answer).encode("utf-8"))
+
+    def _refresh_answer_in_background(
+        self, cache_key: str, query: str, settings: AskSettings
+    ) -> None:
+        own_keys, _ = self._answer_flight.claim([cache_key])
+        if len(own_keys) == 0:
+            # another query is refreshing the same answer
+            return
+
+        def refresh() -> None:
+            try:
+                self.run_query(query=query, settings=settings, refresh_answer=True)
+            except Exception as e:
+                self.logger.error(f"Failed to refresh the cached answer of {query}: {e}")
+            finally:
+                self._answer_flight.resolve(cache_key, None)
+
+        if self._answer_refresh_executor is None:
+            self._answer_refresh_executor = ThreadPoolExecutor(
+                max_workers=2, thread_name_prefix="answer-refresh"
+            )
+        self._answer_refresh_executor.submit(refresh)
+
     def run_query_gradio(
         self,
         query: str,
@@ -675,7 +3439,14 @@ Below is the provided content:
         input_mode_str: str,
         output_mode_str: str,
         extract_schema_str: str,
+        top_k: int,
+        pipeline_mode_str: str,
+        query_variants: int,
+        refresh_answer: bool = False,
     ) -> Generator[Tuple[str, str], None, Tuple[str, str]]:
+        """
+        If refresh_answer is True, the cached answer is ignored and updated.
+        """
         logger = self.logger
         log_queue = Queue()
 
@@ -695,13 +3466,14 @@ Below is the provided content:
             input_mode=InputMode(input_mode_str),
             output_mode=OutputMode(output_mode_str),
             extract_schema_str=extract_schema_str,
+            top_k=top_k,
+            pipeline_mode=PipelineMode(pipeline_mode_str),
+            query_variants=query_variants,
         )
 
-        # add a queue handler to the logger to capture the logs
-        queue_handler = logging.Handler()
-        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-        queue_handler.emit = lambda record: log_queue.put(formatter.format(record))
-        logger.addHandler(queue_handler)
+        # the query runs in its own context, whose logs go to its log queue
+        query_context = contextvars.copy_context()
+        query_context.run(_query_log_queue.set, log_queue)
 
         def update_logs():
             logs = []
@@ -714,9 +3486,63 @@ Below is the provided content:
             return "\n".join(logs)
 
         # wrap the process in a generator to yield the logs to integrate with GradIO
+        def wait_with_logs(fn: Callable[..., Any], *args):
+            # run fn in a thread and keep yielding the logs until it finishes
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                future = _submit_in_context(executor, fn, *args)
+                while not future.done():
+                    wait([future], timeout=0.5)
+                    yield "", update_logs()
+                return future.result()
+
         def process_with_logs():
+            cache_key = self._answer_cache_key(query, settings)
+            cached_answer = self._get_cached_answer(cache_key)
+            if cached_answer is not None and not refresh_answer:
+                age = time.time() - cached_answer["created_at"]
+                if age < self.answer_cache_ttl:
+                    logger.info(f"✅ Using the cached answer from {age:.0f}s ago.")
+                    yield cached_answer["result"], update_logs()
+                    return
+                if self.answer_cache_stale_while_revalidate and self.background_refresh:
+                    logger.info(
+                        f"✅ Using the stale cached answer from {age:.0f}s ago, "
+                        "refreshing it in the background."
+                    )
+                    self._refresh_answer_in_background(cache_key, query, settings)
+                    yield cached_answer["result"], update_logs()
+                    return
+
+            # the API connection counts are logged as the change since this point
+            connection_snapshot = self.api_connection_stats.snapshot()
+
             # the key is the URI and the result is the scraped text
             target_documents: Dict[str, str] = {}
+            # set when the async pipeline has chunked and embedded the documents
+            all_chunks: Optional[Dict[str, List["Chunk"]]] = None
+            embeddings_by_key: Optional[Dict[str, np.ndarray]] = None
+            # set when the local files have been saved to a table in batches
+            ingested_table_name: Optional[str] = None
+            ingested_urls: List[str] = []
+            use_pipeline = (
+                settings.pipeline_mode == PipelineMode.async_
+                and settings.output_mode == OutputMode.answer
+            )
+            # the local files are converted, chunked and embedded by the indexer
+            use_data_index = (
+                self.data_indexer is not None
+                and settings.input_mode == InputMode.local
+                and settings.output_mode == OutputMode.answer
+            )
+
+            # the query and its variants are searched in parallel
+            search_queries = [query]
+            if settings.query_variants > 0:
+                logger.info("Generating query variants ...")
+                yield "", update_logs()
+                search_queries += self.generate_query_variants(query, settings)
+                logger.info(f"✅ Generated query variants: {search_queries[1:]}")
+                yield "", update_logs()
 
             if settings.input_mode == InputMode.search:
                 if len(settings.url_list) > 0:
@@ -724,71 +3550,172 @@ Below is the provided content:
                 else:
                     logger.info("Searching the web ...")
                     yield "", update_logs()
-                    links = self.search_web(query, settings)
+                    links = self.search_web_fanout(search_queries, settings)
                     logger.info(f"✅ Found {len(links)} links for query: {query}")
                     for i, link in enumerate(links):
                         logger.debug(f"{i+1}. {link}")
                     yield "", update_logs()
 
-                logger.info("Scraping the URLs ...")
-                yield "", update_logs()
-                target_documents = self.scrape_urls(links)
+                if use_pipeline:
+                    logger.info("Scraping, chunking and embedding the URLs ...")
+                    yield "", update_logs()
+                    target_documents, all_chunks, embeddings_by_key = (
+                        yield from wait_with_logs(
+                            self.run_pipeline, links, self._scape_url
+                        )
+                    )
+                else:
+                    logger.info("Scraping the URLs ...")
+                    yield "", update_logs()
+                    target_documents = self.scrape_urls(links)
                 logger.info(f"✅ Scraped {len(target_documents)} URLs.")
                 yield "", update_logs()
+            elif use_data_index:
+                if not self.data_indexer.ready.is_set():
+                    logger.info("Waiting for the data folder to be indexed ...")
+                    yield "", update_logs()
+                    yield from wait_with_logs(self.data_indexer.ready.wait)
+                indexed_count = self.data_indexer.indexed_count
+                logger.info(f"✅ Using the index of {indexed_count} local files.")
+                yield "", update_logs()
             elif settings.input_mode == InputMode.local:
-                logger.info("Processing the local data directory ...")
+                logger.info(f"Processing the local data directory {self.data_dir} ...")
+                yield "", update_logs()
+                file_paths = self.list_data_files()
+                if use_pipeline:
+                    target_documents, all_chunks, embeddings_by_key = (
+                        yield from wait_with_logs(
+                            self.run_pipeline,
+                            list(file_paths),
+                            self._convert_local_file,
+                        )
+                    )
+                    processed_count = len(target_documents)
+                elif settings.output_mode == OutputMode.answer:
+                    ingested_table_name, ingested_urls = yield from wait_with_logs(
+                        self.ingest_local_files, file_paths, settings.hybrid_search
+                    )
+                    processed_count = len(ingested_urls)
+                else:
+                    target_documents = yield from wait_with_logs(
+                        self.convert_local_files, list(file_paths)
+                    )
+                    processed_count = len(target_documents)
+                logger.info(f"✅ Processed {processed_count} local files.")
                 yield "", update_logs()
-                # read the files from the data folder
-                data_folder = os.path.join(script_dir, "data")
-                if not os.path.exists(data_folder):
-                    raise Exception("Data folder not found.")
-                for file_name in os.listdir(data_folder):
-                    logger.info(f"Processing {file_name} ...")
-                    yield "", update_logs()
-                    file_path = os.path.join(data_folder, file_name)
-                    file_uri = f"file://{file_path}"
-                    target_documents[file_uri] = self.convert_file_to_md(file_path)
-                    logger.info(f"✅ Finished processing {file_name}.")
-                    yield "", update_logs()
             else:
                 raise Exception(f"Invalid input mode: {settings.input_mode}")
 
             if settings.output_mode == OutputMode.answer:
-                logger.info("Chunking the text ...")
-                yield "", update_logs()
-                all_chunks = self.chunk_results(target_documents)
-                chunk_count = 0
-                for url, chunks in all_chunks.items():
-                    logger.debug(f"URL: {url}")
-                    chunk_count += len(chunks)
-                    for i, chunk in enumerate(chunks):
-                        logger.debug(f"Chunk {i+1}: {chunk.text}")
-                logger.info(f"✅ Generated {chunk_count} chunks ...")
-                yield "", update_logs()
+                if use_data_index:
+                    logger.info("Querying the data folder index to get context ...")
+                    matched_chunks = self.search_chunks(
+                        local_table_name, search_queries, settings
+                    )
+                elif ingested_table_name is not None:
+                    logger.info("Querying the vector DB to get context ...")
+                    if self.corpus_db_file:
+                        matched_chunks = self.search_chunks(
+                            ingested_table_name,
+                            search_queries,
+                            settings,
+                            urls=ingested_urls,
+                        )
+                        self.maybe_compact_corpus()
+                    else:
+                        matched_chunks = self.search_chunks(
+                            ingested_table_name, search_queries, settings
+                        )
+                        self.drop_table(ingested_table_name)
+                else:
+                    content_hashes = {
+                        url: _content_hash(text)
+                        for url, text in target_documents.items()
+                    }
+                    if all_chunks is None:
+                        new_documents = self.filter_new_documents(target_documents)
+
+                        logger.info("Chunking the text ...")
+                        yield "", update_logs()
+                        all_chunks = self.chunk_results(new_documents)
+                    chunk_count = 0
+                    for url, chunks in all_chunks.items():
+                        logger.debug(f"URL: {url}")
+                        chunk_count += len(chunks)
+                        for i, chunk in enumerate(chunks):
+                            logger.debug(f"Chunk {i+1}: {chunk.text}")
+                    logger.info(f"✅ Generated {chunk_count} chunks ...")
+                    yield "", update_logs()
 
-                logger.info(f"Saving {chunk_count} chunks to DB ...")
-                yield "", update_logs()
-                table_name = self.save_chunks_to_db(all_chunks)
-                logger.info(f"✅ Successfully embedded and saved chunks to DB.")
-                yield "", update_logs()
+                    logger.info(f"Saving {chunk_count} chunks to DB ...")
+                    yield "", update_logs()
+                    table_name = self.save_chunks_to_db(
+                        all_chunks,
+                        content_hashes,
+                        embeddings_by_key,
+                        fts_index=settings.hybrid_search,
+                    )
+                    logger.info(f"✅ Successfully embedded and saved chunks to DB.")
+                    yield "", update_logs()
 
-                logger.info("Querying the vector DB to get context ...")
-                matched_chunks = self.vector_search(table_name, query, settings)
+                    logger.info("Querying the vector DB to get context ...")
+                    if self.corpus_db_file:
+                        matched_chunks = self.search_chunks(
+                            table_name,
+                            search_queries,
+                            settings,
+                            urls=list(target_documents.keys()),
+                        )
+                        self.maybe_compact_corpus()
+                    else:
+                        matched_chunks = self.search_chunks(
+                            table_name, search_queries, settings
+                        )
+                        self.drop_table(table_name)
                 for i, result in enumerate(matched_chunks):
                     logger.debug(f"{i+1}. {result}")
                 logger.info(f"✅ Got {len(matched_chunks)} matched chunks.")
                 yield "", update_logs()
 
+                retrieved_hash = _content_hash(
+                    json.dumps([[chunk["url"], chunk["chunk"]] for chunk in matched_chunks])
+                )
+                if (
+                    cached_answer is not None
+                    and cached_answer["retrieved_hash"] == retrieved_hash
+                ):
+                    logger.info(
+                        "✅ Got the same context as the cached answer, skipping inference."
+                    )
+                    self._save_answer_to_cache(
+                        cache_key, cached_answer["result"], retrieved_hash
+                    )
+                    yield cached_answer["result"], update_logs()
+                    return
+
                 logger.info("Running inference with context ...")
                 yield "", update_logs()
-                answer = self.run_inference(
-                    query=query,
-                    matched_chunks=matched_chunks,
-                    settings=settings,
-                )
+                if self.inference_streaming:
+                    answer = ""
+                    for delta in self.run_inference_stream(
+                        query=query,
+                        matched_chunks=matched_chunks,
+                        settings=settings,
+                    ):
+                        answer += delta
+                        yield f"# Answer\n\n{answer}", update_logs()
+                else:
+                    answer = self.run_inference(
+                        query=query,
+                        matched_chunks=matched_chunks,
+                        settings=settings,
+                    )
                 logger.info("✅ Finished inference API call.")
+                logger.info(
+                    "API connections of the query: "
+                    f"{self.api_connection_stats.stats_str(connection_snapshot)}."
+                )
                 logger.info("Generating output ...")
-                yield "", update_logs()
 
                 answer = f"# Answer\n\n{answer}\n"
                 references = "\n".join(
@@ -797,31 +3724,90 @@ Below is the provided content:
                         for i, result in enumerate(matched_chunks)
                     ]
                 )
-                yield f"{answer}\n\n# References\n\n{references}", update_logs()
+                result = f"{answer}\n\n# References\n\n{references}"
+                self._save_answer_to_cache(cache_key, result, retrieved_hash)
+                yield result, update_logs()
             elif settings.output_mode == OutputMode.extract:
+                retrieved_hash = _content_hash(
+                    json.dumps(sorted(target_documents.items()))
+                )
+                if (
+                    cached_answer is not None
+                    and cached_answer["retrieved_hash"] == retrieved_hash
+                ):
+                    logger.info(
+                        "✅ Got the same documents as the cached answer, skipping extraction."
+                    )
+                    self._save_answer_to_cache(
+                        cache_key, cached_answer["result"], retrieved_hash
+                    )
+                    yield cached_answer["result"], update_logs()
+                    return
+
                 logger.info("Extracting structured data ...")
                 yield "", update_logs()
 
+                # extract the documents in parallel, output them in the original order
+                urls = list(target_documents.keys())
+                parts_by_url = {
+                    url: self.split_for_extract(url, text)
+                    for url, text in target_documents.items()
+                }
+                part_items: Dict[str, Dict[int, List[BaseModel]]] = {
+                    url: {} for url in urls
+                }
+                extracted: Dict[str, List[BaseModel]] = {}
                 aggregated_output = {}
-                for url, text in target_documents.items():
-                    items = self.run_extract(
-                        query=query,
-                        extract_schema_str=extract_schema_str,
-                        target_content=text,
-                        settings=settings,
-                    )
-                    self.logger.info(
-                        f"✅ Finished inference API call. Extracted {len(items)} items from {url}."
-                    )
-                    yield "", update_logs()
-
-                    self.logger.debug(items)
-                    aggregated_output[url] = items
+                with ThreadPoolExecutor(max_workers=self.extract_concurrency) as executor:
+                    future_to_part = {
+                        _submit_in_context(
+                            executor,
+                            self.run_extract,
+                            query=query,
+                            extract_schema_str=extract_schema_str,
+                            target_content=part,
+                            settings=settings,
+                        ): (url, i)
+                        for url, parts in parts_by_url.items()
+                        for i, part in enumerate(parts)
+                    }
+                    pending = set(future_to_part.keys())
+                    while len(pending) > 0:
+                        done, pending = wait(
+                            pending, timeout=0.5, return_when=FIRST_COMPLETED
+                        )
+                        for future in done:
+                            url, part_index = future_to_part[future]
+                            part_items[url][part_index] = future.result()
+                            part_count = len(parts_by_url[url])
+                            if len(part_items[url]) < part_count:
+                                continue
+
+                            items = _merge_extracted_items(
+                                [part_items[url][i] for i in range(part_count)]
+                            )
+                            self.logger.info(
+                                f"✅ Finished inference API call. Extracted {len(items)} items from {url}."
+                            )
+                            self.logger.debug(items)
+                            extracted[url] = items
+
+                        while (
+                            len(aggregated_output) < len(urls)
+                            and urls[len(aggregated_output)] in extracted
+                        ):
+                            url = urls[len(aggregated_output)]
+                            aggregated_output[url] = extracted[url]
+                        yield _output_csv(aggregated_output, "SourceURL"), update_logs()
 
                 logger.info("✅ Finished extraction from all urls.")
+                logger.info(
+                    "API connections of the query: "
+                    f"{self.api_connection_stats.stats_str(connection_snapshot)}."
+                )
                 logger.info("Generating output ...")
-                yield "", update_logs()
                 answer = _output_csv(aggregated_output, "SourceURL")
+                self._save_answer_to_cache(cache_key, answer, retrieved_hash)
                 yield f"{answer}", update_logs()
             else:
                 raise Exception(f"Invalid output mode: {settings.output_mode}")
@@ -829,13 +3815,16 @@ Below is the provided content:
         logs = ""
         final_result = ""
 
-        try:
-            for result, log_update in process_with_logs():
+        steps = process_with_logs()
+        while True:
+            try:
+                result, log_update = query_context.run(next, steps)
+            except StopIteration:
+                break
+            if log_update:
                 logs += log_update + "\n"
-                final_result = result
-                yield final_result, logs
-        finally:
-            logger.removeHandler(queue_handler)
+            final_result = result
+            yield final_result, logs
 
         return final_result, logs
 
@@ -843,9 +3832,27 @@ Below is the provided content:
         self,
         query: str,
         settings: AskSettings,
+        refresh_answer: bool = False,
     ) -> str:
+        final_result = ""
+        for result in self.run_query_stream(
+            query=query, settings=settings, refresh_answer=refresh_answer
+        ):
+            final_result = result
+        return final_result
+
+    def run_query_stream(
+        self,
+        query: str,
+        settings: AskSettings,
+        refresh_answer: bool = False,
+    ) -> Generator[str, None, None]:
+        """
+        Yield the full output so far each time it grows.
+        """
         url_list_str = "\n".join(settings.url_list)
 
+        last_result = ""
         for result, logs in self.run_query_gradio(
             query=query,
             date_restrict=settings.date_restrict,
@@ -858,9 +3865,90 @@ Below is the provided content:
             input_mode_str=settings.input_mode,
             output_mode_str=settings.output_mode,
             extract_schema_str=settings.extract_schema_str,
+            top_k=settings.top_k,
+            pipeline_mode_str=settings.pipeline_mode,
+            query_variants=settings.query_variants,
+            refresh_answer=refresh_answer,
         ):
-            final_result = result
-        return final_result
+            if result != last_result:
+                last_result = result
+                yield result
+
+
+class DataFolderIndexer:
+    """
+    Keep the chunks of the files in the data folder up to date in the local table.
+    """
+
+    def __init__(self, ask: Ask, interval: float, logger: logging.Logger):
+        self.ask = ask
+        self.interval = interval
+        self.logger = logger
+        # set after the first scan of the folder has finished
+        self.ready = threading.Event()
+
+        # the key is the file path and the value is its path, size and mtime
+        self._file_signatures: Dict[str, str] = {}
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def indexed_count(self) -> int:
+        return len(self._file_signatures)
+
+    def start(self) -> None:
+        self.ask.ensure_persistent_tables(local_table_name)
+        self._thread = threading.Thread(
+            target=self._run, name="data-folder-indexer", daemon=True
+        )
+        self._thread.start()
+        self.logger.info(f"✅ Started watching the data folder {self.ask.data_dir}.")
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.index_once()
+            except Exception as e:
+                self.logger.error(f"Failed to index the data folder: {e}")
+            self.ready.set()
+            self._stop_event.wait(self.interval)
+
+    def index_once(self) -> None:
+        signatures: Dict[str, str] = {}
+        for file_path in self.ask.list_data_files():
+            try:
+                signatures[file_path] = self.ask._conversion_cache_key(file_path)
+            except FileNotFoundError:
+                # deleted after the listing
+                continue
+
+        file_uris = {f"file://{file_path}" for file_path in signatures}
+        deleted_urls = [
+            url
+            for url in self.ask.get_document_urls(local_table_name)
+            if url not in file_uris
+        ]
+        if len(deleted_urls) > 0:
+            self.ask.delete_documents(local_table_name, deleted_urls)
+            self.logger.info(f"✅ Removed {len(deleted_urls)} deleted files.")
+
+        changed_paths = [
+            file_path
+            for file_path, signature in signatures.items()
+            if self._file_signatures.get(file_path) != signature
+        ]
+        if len(changed_paths) > 0:
+            self.logger.info(f"Indexing {len(changed_paths)} new or modified files ...")
+            self.ask.ingest_local_files(changed_paths, table_name=local_table_name)
+            self.logger.info(f"✅ Indexed {len(changed_paths)} files.")
+
+        # the files that failed to convert are retried when they are modified
+        self._file_signatures = signatures
 
 
 def launch_gradio(
@@ -868,8 +3956,15 @@ def launch_gradio(
     init_settings: AskSettings,
     share_ui: bool,
     logger: logging.Logger,
+    ask_options: Optional[Dict[str, Any]] = None,
+    watch_data: bool = False,
 ) -> None:
-    ask = Ask(logger=logger)
+    import gradio as gr
+
+    # the keyword arguments to create the Ask instance
+    ask = Ask(logger=logger, background_refresh=True, **(ask_options or {}))
+    if watch_data:
+        ask.start_data_indexer()
 
     def toggle_schema_textbox(option):
         if option == "extract":
@@ -941,6 +4036,21 @@ def launch_gradio(
                         label="Inference Model Name",
                         value=init_settings.inference_model_name,
                     )
+                    top_k_input = gr.Number(
+                        label="Top K [Number of chunks to retrieve from each search.]",
+                        value=init_settings.top_k,
+                        precision=0,
+                    )
+                    pipeline_mode_input = gr.Radio(
+                        label="Pipeline Mode [async: chunk and embed each page as soon as it is scraped.]",
+                        choices=["sequential", "async"],
+                        value=init_settings.pipeline_mode,
+                    )
+                    query_variants_input = gr.Number(
+                        label="Query Variants [Rewrites of the query searched in parallel, 0 to disable.]",
+                        value=init_settings.query_variants,
+                        precision=0,
+                    )
 
                 submit_button = gr.Button("Submit")
 
@@ -962,11 +4072,96 @@ def launch_gradio(
                 input_mode_input,
                 output_mode_input,
                 extract_schema_input,
+                top_k_input,
+                pipeline_mode_input,
+                query_variants_input,
             ],
             outputs=[answer_output, logs_output],
         )
 
-    demo.queue().launch(share=share_ui)
+    try:
+        demo.queue(default_concurrency_limit=ask.gradio_concurrency).launch(
+            share=share_ui
+        )
+    finally:
+        ask.close()
+
+
+def run_batch_queries(
+    ask: Ask,
+    batch_file: str,
+    base_settings: AskSettings,
+    output: io.TextIOBase,
+    concurrency: int,
+    logger: logging.Logger,
+) -> None:
+    """
+    Run the queries in a JSONL file concurrently with one Ask instance.
+
+    Each line is a JSON object with a "query" key, an optional "id" key, and
+    optional AskSettings fields. One JSON line is written for each query.
+    """
+    batch_items: List[Tuple[str, str, AskSettings]] = []
+    with open(batch_file, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            if line.strip() == "" or line.startswith("#"):
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise Exception(
+                    f"Invalid JSON in line {line_number} of {batch_file}: {e}"
+                )
+            if not isinstance(item, dict):
+                raise Exception(
+                    f"Line {line_number} of {batch_file} is not a JSON object"
+                )
+            query = item.pop("query", None)
+            if not query:
+                raise Exception(f"No query found in line {line_number} of {batch_file}")
+            item_id = str(item.pop("id", line_number))
+            unknown_keys = sorted(set(item) - set(AskSettings.model_fields))
+            if len(unknown_keys) > 0:
+                raise Exception(
+                    f"Unknown settings {', '.join(unknown_keys)} in line "
+                    f"{line_number} of {batch_file}"
+                )
+            settings = AskSettings(**{**base_settings.model_dump(), **item})
+            batch_items.append((item_id, query, settings))
+
+    logger.info(
+        f"Running {len(batch_items)} queries from {batch_file} "
+        f"with concurrency {concurrency} ..."
+    )
+    output_lock = threading.Lock()
+
+    def run_item(item_id: str, query: str, settings: AskSettings) -> Dict[str, Any]:
+        start_time = time.perf_counter()
+        record: Dict[str, Any] = {"id": item_id, "query": query}
+        try:
+            record["result"] = ask.run_query(query=query, settings=settings)
+        except Exception as e:
+            logger.error(f"Query {item_id} failed: {e}")
+            record["error"] = str(e)
+        record["seconds"] = round(time.perf_counter() - start_time, 3)
+        with output_lock:
+            output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            output.flush()
+        return record
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(run_item, *item) for item in batch_items]
+        failed_count = sum(
+            1 for future in as_completed(futures) if "error" in future.result()
+        )
+    logger.info(
+        f"✅ Finished {len(batch_items)} queries in "
+        f"{time.perf_counter() - start_time:.2f}s, {failed_count} failed."
+    )
+    logger.info(
+        f"API connections (process total): {ask.api_connection_stats.stats_str()}."
+    )
 
 
 @click.command(help="Search web for the query and summarize the results.")
@@ -979,7 +4174,7 @@ def launch_gradio(
     required=False,
     help=(
         "Input mode for the query, default is search. "
-        "When using local, files under 'data' folder will be used as input."
+        "When using local, files under the data folder will be used as input."
     ),
 )
 @click.option(
@@ -1045,6 +4240,116 @@ def launch_gradio(
     is_flag=True,
     help="Do not use hybrid search mode, use vector search only.",
 )
+@click.option(
+    "--top-k",
+    type=int,
+    required=False,
+    default=10,
+    show_default=True,
+    help=(
+        "Number of chunks to use as the context, after fusing the vector search "
+        "and the full-text search results and the optional reranking"
+    ),
+)
+@click.option(
+    "--pipeline-mode",
+    type=click.Choice(["sequential", "async"], case_sensitive=False),
+    default="sequential",
+    required=False,
+    show_default=True,
+    help=(
+        "In async mode, each page is chunked and embedded as soon as it is scraped "
+        "while the other pages are still downloading."
+    ),
+)
+@click.option(
+    "--query-variants",
+    type=int,
+    required=False,
+    default=0,
+    show_default=True,
+    help=(
+        "Number of query rewrites to search in parallel with the query, "
+        "their results are merged with the results of the query"
+    ),
+)
+@click.option(
+    "--scrape-concurrency",
+    type=int,
+    required=False,
+    default=None,
+    help=(
+        "Max number of concurrent HTTP requests when scraping, "
+        "default is the SCRAPE_CONCURRENCY env variable or 20."
+    ),
+)
+@click.option(
+    "--data-dir",
+    type=str,
+    required=False,
+    default=None,
+    help=(
+        "The folder of the local files for the local input mode, walked recursively, "
+        "default is the DATA_DIR env variable or the 'data' folder."
+    ),
+)
+@click.option(
+    "--include",
+    type=str,
+    multiple=True,
+    help=(
+        "Only use the local files matching this glob, e.g., '*.pdf', "
+        "can be repeated, matched against the path relative to the data folder"
+    ),
+)
+@click.option(
+    "--exclude",
+    type=str,
+    multiple=True,
+    help="Skip the local files and folders matching this glob, can be repeated",
+)
+@click.option(
+    "--batch-file",
+    type=str,
+    required=False,
+    default="",
+    help=(
+        "Run the queries in a JSONL file in one process, one JSON object per line "
+        'with a "query" key, an optional "id" key, and optional settings overrides'
+    ),
+)
+@click.option(
+    "--batch-output",
+    type=str,
+    required=False,
+    default="",
+    help="The JSONL file to write the batch results to, default is stdout",
+)
+@click.option(
+    "--batch-concurrency",
+    type=int,
+    required=False,
+    default=4,
+    show_default=True,
+    help="Number of batch queries to run at the same time",
+)
+@click.option(
+    "--watch-data",
+    is_flag=True,
+    help=(
+        "With the Gradio UI, index the data folder in the background and keep the "
+        "index up to date, so that the local mode queries only search the index"
+    ),
+)
+@click.option(
+    "--profile-startup",
+    is_flag=True,
+    help=(
+        "Print the import and initialization time of each component to stderr "
+        "after the command line run, all components are initialized if no query "
+        "is given"
+    ),
+)
 @click.option(
     "--run-cli",
     "-c",
@@ -1080,6 +4385,18 @@ def search_extract_summarize(
     extract_schema_file: str,
     inference_model_name: str,
     vector_search_only: bool,
+    top_k: int,
+    pipeline_mode: str,
+    query_variants: int,
+    scrape_concurrency: Optional[int],
+    data_dir: Optional[str],
+    include: Tuple[str, ...],
+    exclude: Tuple[str, ...],
+    batch_file: str,
+    batch_output: str,
+    batch_concurrency: int,
+    watch_data: bool,
+    profile_startup: bool,
     run_cli: bool,
     env: str,
     log_level: str,
@@ -1114,15 +4431,61 @@ def search_extract_summarize(
         input_mode=InputMode(input_mode),
         output_mode=OutputMode(output_mode),
         extract_schema_str=_read_extract_schema_str(extract_schema_file),
+        top_k=top_k,
+        pipeline_mode=PipelineMode(pipeline_mode),
+        query_variants=query_variants,
     )
 
-    if run_cli:
+    ask_options = {
+        "scrape_concurrency": scrape_concurrency,
+        "data_dir": data_dir,
+        "data_include": list(include),
+        "data_exclude": list(exclude),
+    }
+
+    if batch_file:
+        ask = Ask(logger=logger, **ask_options)
+        try:
+            if batch_output:
+                with open(batch_output, "w") as f:
+                    run_batch_queries(
+                        ask, batch_file, settings, f, batch_concurrency, logger
+                    )
+            else:
+                run_batch_queries(
+                    ask, batch_file, settings, sys.stdout, batch_concurrency, logger
+                )
+            if profile_startup:
+                click.echo(ask.format_startup_profile(), err=True)
+        finally:
+            ask.close()
+    elif run_cli:
+        if query is None and profile_startup:
+            ask = Ask(logger=logger, **ask_options)
+            try:
+                ask.init_all_components()
+                click.echo(ask.format_startup_profile(), err=True)
+            finally:
+                ask.close()
+            return
         if query is None:
             raise Exception("Query is required for the command line mode")
-        ask = Ask(logger=logger)
+        ask = Ask(logger=logger, **ask_options)
 
-        final_result = ask.run_query(query=query, settings=settings)
-        click.echo(final_result)
+        try:
+            # print the answer tokens as they are streamed
+            printed = ""
+            for result in ask.run_query_stream(query=query, settings=settings):
+                if result.startswith(printed):
+                    click.echo(result[len(printed) :], nl=False)
+                else:
+                    click.echo(f"\n{result}", nl=False)
+                printed = result
+            click.echo()
+            if profile_startup:
+                click.echo(ask.format_startup_profile(), err=True)
+        finally:
+            ask.close()
     else:
         if os.environ.get("SHARE_GRADIO_UI", "false").lower() == "true":
             share_ui = True
@@ -1133,6 +4496,8 @@ def search_extract_summarize(
             init_settings=settings,
             share_ui=share_ui,
             logger=logger,
+            ask_options=ask_options,
+            watch_data=watch_data,
         )
 
 
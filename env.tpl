@@ -2,6 +2,20 @@
 SEARCH_API_URL=https://www.googleapis.com/customsearch/v1
 SEARCH_API_KEY=<your-google-search-api-key>
 SEARCH_PROJECT_KEY=<your-google-cx-key>
+# Number of search results to scrape, after the first result page of 10 the later pages
+# that exist are fetched in parallel
+# SEARCH_RESULT_COUNT=10
+# Max number of search API responses to keep in the cache and their TTL in seconds,
+# set SEARCH_CACHE_MAX_ENTRIES to 0 to disable the cache
+# SEARCH_CACHE_MAX_ENTRIES=1000
+# SEARCH_CACHE_TTL=86400
+
+# With --query-variants N, the query is rewritten by the LLM (or heuristics) into up to N variants
+# that are searched in parallel, each fan-out stage waits at most the budget in seconds
+# for the variants, and at most QUERY_FANOUT_MAX_URLS links are scraped
+# QUERY_REWRITE_MODE=llm
+# QUERY_FANOUT_BUDGET=10
+# QUERY_FANOUT_MAX_URLS=20
 
 # right now we use OpenAI API as the default LLM inference engine and embedding model
 LLM_BASE_URL=https://api.openai.com/v1
@@ -10,7 +24,120 @@ DEFAULT_INFERENCE_MODEL=gpt-4o-mini
 EMBEDDING_MODEL=text-embedding-3-small
 EMBEDDING_DIMENSIONS=1536
 
+# Limits of one embedding request, the chunks of all the documents are packed up to
+# them, and the token budget adapts to the rate limits and the request latency
+# EMBED_MAX_BATCH_TOKENS=100000
+# EMBED_MAX_BATCH_ITEMS=2048
+# Max concurrent embedding requests, retries with backoff, and the target latency
+# in seconds above which the batches get smaller
+# EMBED_CONCURRENCY=8
+# EMBED_MAX_RETRIES=5
+# EMBED_TARGET_LATENCY=10
+
+# Use EMBEDDING_MODEL=local:<sentence-transformers model> to embed in the process on
+# the CPU, EMBEDDING_DIMENSIONS must match the model, e.g., 384 for all-MiniLM-L6-v2
+# LOCAL_EMBED_BACKEND=torch
+# LOCAL_EMBED_BATCH_SIZE=64
+# LOCAL_EMBED_THREADS=8
+
+# The LLM and embedding API clients are created once and share a pool of keep-alive
+# connections, with these limits and timeouts in seconds
+# LLM_MAX_CONNECTIONS=64
+# LLM_MAX_KEEPALIVE_CONNECTIONS=32
+# LLM_KEEPALIVE_EXPIRY=60
+# LLM_TIMEOUT=120
+# LLM_CONNECT_TIMEOUT=10
+
 # Run and share Gradio UI
 RUN_GRADIO_UI=False
 SHARE_GRADIO_UI=False
+# Max queries the Gradio UI runs at the same time
+# GRADIO_CONCURRENCY=4
+
+
+# Local caches are stored under CACHE_DIR, default is the .cache folder in the package root
+# CACHE_DIR=/path/to/cache
+# Max number of chunk embeddings to keep in the cache, set to 0 to disable the cache
+EMBEDDING_CACHE_MAX_ENTRIES=50000
+
+# Save all the chunks in a persistent DuckDB corpus file instead of a new table per query
+# CORPUS_DB_FILE=/path/to/corpus.duckdb
+# Evict documents not seen in the last N days, checked in the background every N queries
+# CORPUS_MAX_AGE_DAYS=30
+# CORPUS_COMPACT_INTERVAL=100
+# The full text search index of the corpus is rebuilt when this many chunks have changed
+# or the oldest change is this many seconds old, and when the corpus is compacted
+# FTS_REBUILD_MIN_CHANGES=1000
+# FTS_REBUILD_MAX_AGE=600
+
+# HNSW search candidate list size, larger values give better recall but slower search
+# HNSW_EF_SEARCH=64
+# Threads of the DuckDB instance shared by all the queries, default is the CPU count
+# DUCKDB_THREADS=4
+
+# The vector search and the full text search each return this many candidates, which are
+# fused (rrf or weighted score fusion) and reranked into the top-k chunks of the context
+# RETRIEVAL_CANDIDATES=30
+# FUSION_METHOD=rrf
+# FUSION_VECTOR_WEIGHT=0.5
+# Rerank the candidates with a local cross-encoder, requires the local-embedding extra
+# RERANK_MODEL=cross-encoder/ms-marco-MiniLM-L-6-v2
+# RERANK_BATCH_SIZE=32
+
+# Max documents in the fetch, chunk and embed stages at the same time in the async pipeline mode
+# PIPELINE_FETCH_CONCURRENCY=10
+# PIPELINE_CHUNK_CONCURRENCY=4
+# PIPELINE_EMBED_CONCURRENCY=8
+
+# Stream the answer tokens from the LLM, set to false if the endpoint does not support streaming
+# INFERENCE_STREAMING=true
+
+# Max documents to extract from at the same time in the extract output mode
+# EXTRACT_CONCURRENCY=4
+# Documents with more estimated tokens are split into parts and extracted in parallel
+# EXTRACT_MAX_TOKENS=16000
+
+# Max number of scraped pages to keep in the cache, set to 0 to disable the cache
+SCRAPE_CACHE_MAX_ENTRIES=10000
+# Cached pages are used as is for this many seconds, then revalidated with a conditional GET
+# SCRAPE_CACHE_TTL=3600
+
+# Max number of complete answers to keep in the cache, keyed by the normalized query,
+# the settings, the models and prompts, and the data folder files in the local mode,
+# set to 0 to disable the cache
+ANSWER_CACHE_MAX_ENTRIES=1000
+# Cached answers are served as is for this many seconds, then the query runs again and
+# the inference is skipped if the retrieved context has not changed
+# ANSWER_CACHE_TTL=3600
+# Serve the expired answer right away and refresh it in the background, only in the
+# Gradio UI, the command line and batch runs always run the expired queries again
+# ANSWER_CACHE_STALE_WHILE_REVALIDATE=false
+
+# Markdown converted from the local data files, keyed by the file path, size and mtime,
+# only new or modified files are converted again, set to 0 to disable
+CONVERSION_CACHE_MAX_ENTRIES=1000
+# Number of processes converting the uncached local files with Docling, 0 to convert
+# in the query process, defaults to min(4, CPU count)
+# LOCAL_CONVERT_WORKERS=4
+# The folder of the local files, walked recursively, defaults to the 'data' folder
+# DATA_DIR=/path/to/docs
+# Comma separated globs matched against the paths relative to DATA_DIR or the names
+# DATA_INCLUDE=*.pdf,*.md
+# DATA_EXCLUDE=drafts,*.tmp
+# Number of local files converted, chunked and embedded together
+# LOCAL_INGEST_BATCH_SIZE=32
+# Seconds between two scans of the data folder when running with --watch-data
+# DATA_WATCH_INTERVAL=10
 
+# HTML text extractor for scraped pages: lxml (fast, drops script/style/nav boilerplate) or bs4
+# HTML_TEXT_EXTRACTOR=lxml
+# Processes to parse scraped pages larger than SCRAPE_PARSE_MIN_BYTES, default is the CPU
+# count up to 4
+# SCRAPE_PARSE_WORKERS=4
+# SCRAPE_PARSE_MIN_BYTES=262144
+# HTTP client limits for scraping: total concurrent requests, concurrent requests per host,
+# min seconds between two requests to the same host, and HTTP/2 (needs the h2 package)
+# SCRAPE_CONCURRENCY=20
+# SCRAPE_PER_HOST_CONCURRENCY=2
+# SCRAPE_POLITENESS_DELAY=0.25
+# SCRAPE_HTTP2=false
@@ -0,0 +1,153 @@
+# Compare the embedding throughput of the in-process local model with the
+# OpenAI-compatible API path used by Ask.embed_texts, and the latency of
+# embedding a single query with each of them.
+#
+# The API path is skipped if no API key is found in the environment or the
+# .env file.
+#
+# Usage: python scripts/bench_embedding.py --num-chunks 1000 \
+#            --local-model sentence-transformers/all-MiniLM-L6-v2
+import logging
+import os
+import statistics
+import sys
+import time
+from typing import Callable, List
+
+import click
+import numpy as np
+from dotenv import load_dotenv
+from openai import OpenAI
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ask import EmbeddingBatcher, LocalEmbeddingModel, local_embedding_prefix
+
+default_env_file = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"
+)
+
+
+def make_chunks(num_chunks: int, chunk_words: int) -> List[str]:
+    rng = np.random.default_rng(0)
+    vocabulary = (
+        "search extract summarize query answer document chunk vector index "
+        "embedding model token batch latency throughput network local remote "
+        "database table column row page text"
+    ).split()
+    return [
+        " ".join(rng.choice(vocabulary, size=chunk_words)) + f" {i}"
+        for i in range(num_chunks)
+    ]
+
+
+def measure(
+    name: str,
+    embed_fn: Callable[[List[str]], np.ndarray],
+    chunks: List[str],
+    num_queries: int,
+) -> None:
+    # warm up the model or the connection before measuring
+    embed_fn(chunks[:8])
+
+    start = time.perf_counter()
+    embeddings = embed_fn(chunks)
+    elapsed = time.perf_counter() - start
+    assert len(embeddings) == len(chunks), f"{name} returned {len(embeddings)} rows"
+
+    latencies = []
+    for query in chunks[:num_queries]:
+        query_start = time.perf_counter()
+        embed_fn([query])
+        latencies.append((time.perf_counter() - query_start) * 1000)
+
+    click.echo(
+        f"{name:>8} {len(chunks):>8} {elapsed:>10.2f} {len(chunks) / elapsed:>10.1f} "
+        f"{statistics.median(latencies):>12.1f}"
+    )
+
+
+@click.command(help="Benchmark the local embedding model against the API.")
+@click.option("--num-chunks", default=1000, type=int, help="Number of chunks to embed")
+@click.option("--chunk-words", default=200, type=int, help="Words in each chunk")
+@click.option(
+    "--local-model",
+    default="sentence-transformers/all-MiniLM-L6-v2",
+    show_default=True,
+    help="The sentence-transformers model for the local path",
+)
+@click.option(
+    "--local-backend",
+    type=click.Choice(["torch", "onnx"]),
+    default="torch",
+    show_default=True,
+    help="The inference backend of the local model",
+)
+@click.option("--local-batch-size", default=64, type=int, help="Local batch size")
+@click.option(
+    "--threads",
+    default=os.cpu_count() or 1,
+    type=int,
+    help="Intra-op threads of the local model, default is the CPU count",
+)
+@click.option("--num-queries", default=20, type=int, help="Single query embeddings")
+@click.option("--env", default=default_env_file, help="The environment file to use")
+def main(
+    num_chunks: int,
+    chunk_words: int,
+    local_model: str,
+    local_backend: str,
+    local_batch_size: int,
+    threads: int,
+    num_queries: int,
+    env: str,
+) -> None:
+    load_dotenv(dotenv_path=env, override=False)
+    chunks = make_chunks(num_chunks, chunk_words)
+
+    click.echo(
+        f"{'backend':>8} {'chunks':>8} {'seconds':>10} {'chunks/s':>10} "
+        f"{'query ms':>12}"
+    )
+
+    model = LocalEmbeddingModel(
+        model_name=local_model,
+        backend=local_backend,
+        batch_size=local_batch_size,
+        num_threads=threads,
+    )
+    measure("local", model.embed, chunks, num_queries)
+
+    api_key = os.environ.get("EMBED_API_KEY") or os.environ.get("LLM_API_KEY")
+    if not api_key:
+        click.echo("No EMBED_API_KEY or LLM_API_KEY found, skipping the API path.")
+        return
+
+    base_url = (
+        os.environ.get("EMBED_BASE_URL")
+        or os.environ.get("LLM_BASE_URL")
+        or "https://api.openai.com/v1"
+    )
+    api_model = os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+    if api_model.startswith(local_embedding_prefix):
+        api_model = "text-embedding-3-small"
+    client = OpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+
+    def embed_with_api(texts: List[str]) -> List[List[float]]:
+        response = client.embeddings.create(input=texts, model=api_model)
+        return [data.embedding for data in response.data]
+
+    batcher = EmbeddingBatcher(
+        embed_fn=embed_with_api,
+        max_batch_tokens=100000,
+        max_batch_items=2048,
+        max_concurrency=8,
+        max_retries=5,
+        target_latency=10,
+        logger=logging.getLogger("bench_embedding"),
+    )
+    measure("api", batcher.embed, chunks, num_queries)
+
+
+if __name__ == "__main__":
+    main()
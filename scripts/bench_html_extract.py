@@ -0,0 +1,78 @@
+# Compare the speed and the extracted text quality of the HTML text extractors
+# used by Ask._scape_url over a corpus of saved HTML pages.
+#
+# The quality is measured against the text of the <main> or <article> element
+# of each page: recall is the fraction of the main content words that are kept,
+# precision is the fraction of the extracted words that are main content words.
+#
+# Usage: python scripts/bench_html_extract.py --fixture-dir scripts/fixtures/html
+import os
+import sys
+import time
+from typing import Set
+
+import click
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ask import text_extractors
+
+default_fixture_dir = os.path.join(os.path.dirname(__file__), "fixtures", "html")
+
+
+def main_content_words(content: bytes) -> Set[str]:
+    soup = BeautifulSoup(content, "lxml", from_encoding="utf-8")
+    main_tag = soup.find("main") or soup.find("article") or soup.body
+    return set(main_tag.get_text(" ").split())
+
+
+@click.command(help="Benchmark the HTML text extractors on saved pages.")
+@click.option(
+    "--fixture-dir",
+    default=default_fixture_dir,
+    show_default=True,
+    help="Directory of saved HTML pages",
+)
+@click.option("--repeat", default=200, type=int, help="Passes over the corpus")
+def main(fixture_dir: str, repeat: int) -> None:
+    pages = []
+    for file_name in sorted(os.listdir(fixture_dir)):
+        if file_name.endswith(".html") or file_name.endswith(".htm"):
+            with open(os.path.join(fixture_dir, file_name), "rb") as f:
+                pages.append(f.read())
+    if len(pages) == 0:
+        raise click.ClickException(f"No HTML pages found in {fixture_dir}")
+
+    references = [main_content_words(page) for page in pages]
+
+    click.echo(
+        f"{len(pages)} pages, {sum(len(p) for p in pages) / 1024:.0f} KB, "
+        f"{repeat} passes"
+    )
+    click.echo(f"{'extractor':>10} {'pages/sec':>10} {'recall':>8} {'precision':>10}")
+    for name, extractor_class in text_extractors.items():
+        extractor = extractor_class()
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for page in pages:
+                extractor.extract(page)
+        pages_per_sec = len(pages) * repeat / (time.perf_counter() - start)
+
+        recalls = []
+        precisions = []
+        for page, reference in zip(pages, references):
+            words = set((extractor.extract(page) or "").split())
+            recalls.append(len(words & reference) / max(1, len(reference)))
+            precisions.append(len(words & reference) / max(1, len(words)))
+
+        click.echo(
+            f"{name:>10} {pages_per_sec:>10.0f} "
+            f"{sum(recalls) / len(recalls):>8.3f} "
+            f"{sum(precisions) / len(precisions):>10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+# Drive concurrent queries through one Ask instance, the way the Gradio UI does,
+# against a local stub server that plays the search API, the web pages, and the
+# OpenAI-compatible embedding and chat APIs, and report how the throughput scales
+# with the number of concurrent queries.
+#
+# The stub server adds a fixed latency to the embedding and chat calls so that the
+# queries spend most of their time waiting on the network, as they do for real.
+# The caches are disabled so that every query runs the whole pipeline.
+#
+# Usage: python scripts/load_test.py --concurrency 1,2,4,8 --queries 16
+import hashlib
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+import click
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ask import Ask, AskSettings
+
+paragraph = (
+    "DuckDB is an in-process analytical database. The vector similarity search "
+    "extension adds an HNSW index for the array distance functions, and the full "
+    "text search extension adds a BM25 index over the text columns. "
+)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # set by the main function before the server starts
+    num_pages = 5
+    dimensions = 256
+    embed_latency = 0.05
+    llm_latency = 0.5
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _send(self, body: bytes, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        parsed = urllib.parse.urlparse(self.path)
+        if parsed.path == "/search":
+            query = urllib.parse.parse_qs(parsed.query)["q"][0]
+            query_hash = hashlib.md5(query.encode()).hexdigest()[:8]
+            host = f"http://{self.headers['Host']}"
+            items = [
+                {"link": f"{host}/page/{query_hash}/{i}"} for i in range(self.num_pages)
+            ]
+            body = {"searchInformation": {"totalResults": len(items)}, "items": items}
+            self._send(json.dumps(body).encode(), "application/json")
+        else:
+            html = (
+                f"<html><body><main><h1>{parsed.path}</h1>"
+                + f"<p>{paragraph}</p>" * 20
+                + "</main></body></html>"
+            )
+            self._send(html.encode(), "text/html; charset=utf-8")
+
+    def do_POST(self) -> None:
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path.endswith("/embeddings"):
+            time.sleep(self.embed_latency)
+            texts = request["input"]
+            if isinstance(texts, str):
+                texts = [texts]
+            data = []
+            for i, text in enumerate(texts):
+                seed = int(hashlib.md5(text.encode()).hexdigest()[:8], 16)
+                vec = np.random.default_rng(seed).random(self.dimensions)
+                data.append({"object": "embedding", "index": i, "embedding": vec.tolist()})
+            body = {
+                "object": "list",
+                "model": request["model"],
+                "data": data,
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            }
+            self._send(json.dumps(body).encode(), "application/json")
+        elif self.path.endswith("/chat/completions"):
+            time.sleep(self.llm_latency)
+            words = ["The", "answer", "is", "in", "the", "context", "[1]."]
+            if request.get("stream"):
+                events = []
+                for word in words:
+                    chunk = {
+                        "id": "stub",
+                        "object": "chat.completion.chunk",
+                        "created": 0,
+                        "model": request["model"],
+                        "choices": [
+                            {"index": 0, "delta": {"content": f"{word} "}, "finish_reason": None}
+                        ],
+                    }
+                    events.append(f"data: {json.dumps(chunk)}\n\n")
+                events.append("data: [DONE]\n\n")
+                self._send("".join(events).encode(), "text/event-stream")
+            else:
+                body = {
+                    "id": "stub",
+                    "object": "chat.completion",
+                    "created": 0,
+                    "model": request["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": " ".join(words)},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                }
+                self._send(json.dumps(body).encode(), "application/json")
+        else:
+            self.send_error(404)
+
+
+def run_level(ask: Ask, queries: List[str], concurrency: int, hybrid: bool) -> tuple:
+    settings = AskSettings(
+        date_restrict=0,
+        target_site="",
+        output_language="English",
+        output_length=0,
+        url_list=[],
+        inference_model_name="stub-model",
+        hybrid_search=hybrid,
+        input_mode="search",
+        output_mode="answer",
+        extract_schema_str="",
+        top_k=10,
+        pipeline_mode="sequential",
+        query_variants=0,
+    )
+
+    def run_one(query: str) -> float:
+        start = time.perf_counter()
+        result = ask.run_query(query=query, settings=settings)
+        if "# Answer" not in result:
+            raise click.ClickException(f"Unexpected result for {query}: {result}")
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(run_one, queries))
+    return time.perf_counter() - start, latencies
+
+
+def run_levels(ask: Ask, concurrency: str, queries: int, hybrid: bool) -> None:
+    # initialize the components used by the search mode before measuring
+    ask.chunker
+    ask.db_con
+    if hybrid:
+        ask._load_fts_extension()
+
+    click.echo(
+        f"{'conc':>6} {'queries':>8} {'seconds':>8} {'qps':>8} {'p50 s':>8} "
+        f"{'p95 s':>8} {'speedup':>8}"
+    )
+    base_qps = None
+    for level in [int(c) for c in concurrency.split(",")]:
+        level_queries = [f"query {level}-{i}" for i in range(queries)]
+        elapsed, latencies = run_level(ask, level_queries, level, hybrid)
+        qps = len(level_queries) / elapsed
+        if base_qps is None:
+            base_qps = qps
+        p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+        click.echo(
+            f"{level:>6} {len(level_queries):>8} {elapsed:>8.2f} {qps:>8.2f} "
+            f"{statistics.median(latencies):>8.2f} {p95:>8.2f} {qps / base_qps:>7.1f}x"
+        )
+    click.echo(
+        f"API connections (process total): {ask.api_connection_stats.stats_str()}"
+    )
+
+
+@click.command(help="Load test concurrent queries against a local stub server.")
+@click.option("--concurrency", default="1,2,4,8", help="Comma separated concurrency levels")
+@click.option("--queries", default=16, type=int, help="Queries at each level")
+@click.option("--pages", default=5, type=int, help="Search results of each query")
+@click.option("--dimensions", default=256, type=int, help="Embedding dimensions")
+@click.option("--embed-latency", default=0.05, type=float, help="Embedding API seconds")
+@click.option("--llm-latency", default=0.5, type=float, help="Chat API seconds")
+@click.option("--hybrid", is_flag=True, help="Run the full text search too")
+def main(
+    concurrency: str,
+    queries: int,
+    pages: int,
+    dimensions: int,
+    embed_latency: float,
+    llm_latency: float,
+    hybrid: bool,
+) -> None:
+    StubHandler.num_pages = pages
+    StubHandler.dimensions = dimensions
+    StubHandler.embed_latency = embed_latency
+    StubHandler.llm_latency = llm_latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    os.environ.update(
+        {
+            "SEARCH_API_URL": f"{stub_url}/search",
+            "SEARCH_API_KEY": "stub",
+            "SEARCH_PROJECT_KEY": "stub",
+            "LLM_BASE_URL": f"{stub_url}/v1",
+            "LLM_API_KEY": "stub",
+            "EMBEDDING_MODEL": "stub-embedding",
+            "EMBEDDING_DIMENSIONS": str(dimensions),
+            "CACHE_DIR": tempfile.mkdtemp(prefix="ask_load_test_"),
+            "EMBEDDING_CACHE_MAX_ENTRIES": "0",
+            "SCRAPE_CACHE_MAX_ENTRIES": "0",
+            "SEARCH_CACHE_MAX_ENTRIES": "0",
+            "ANSWER_CACHE_MAX_ENTRIES": "0",
+            "SCRAPE_POLITENESS_DELAY": "0",
+            "SCRAPE_PER_HOST_CONCURRENCY": "64",
+        }
+    )
+    ask = Ask(logger=logging.getLogger("load_test"))
+    try:
+        run_levels(ask, concurrency, queries, hybrid)
+    finally:
+        ask.close()
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
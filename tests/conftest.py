@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ask import Ask, AskSettings, _get_logger
+
+
+@pytest.fixture
+def ask_env(tmp_path, monkeypatch):
+    # the API keys are only checked for presence, no API is called by the tests
+    monkeypatch.setenv("SEARCH_API_KEY", "test")
+    monkeypatch.setenv("SEARCH_PROJECT_KEY", "test")
+    monkeypatch.setenv("LLM_API_KEY", "test")
+    monkeypatch.setenv("EMBEDDING_MODEL", "test-embedding")
+    monkeypatch.setenv("EMBEDDING_DIMENSIONS", "8")
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path / "cache"))
+    return tmp_path
+
+
+@pytest.fixture
+def make_ask(ask_env):
+    instances = []
+
+    def make(**kwargs) -> Ask:
+        ask = Ask(logger=_get_logger("WARNING"), **kwargs)
+        instances.append(ask)
+        return ask
+
+    yield make
+    for ask in instances:
+        ask.close()
+
+
+def make_settings(**kwargs) -> AskSettings:
+    values = dict(
+        date_restrict=0,
+        target_site="",
+        output_language="English",
+        output_length=0,
+        url_list=[],
+        inference_model_name="test-model",
+        hybrid_search=False,
+        input_mode="search",
+        output_mode="answer",
+        extract_schema_str="",
+        top_k=5,
+        pipeline_mode="sequential",
+        query_variants=0,
+    )
+    values.update(kwargs)
+    return AskSettings(**values)
@@ -0,0 +1,69 @@
+import io
+import json
+import logging
+import threading
+
+import pytest
+from conftest import make_settings
+
+from ask import ConnectionStats, run_batch_queries
+
+logger = logging.getLogger("test_batch_queries")
+
+
+class StubAsk:
+    def __init__(self):
+        self.api_connection_stats = ConnectionStats()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def run_query(self, query, settings):
+        with self._lock:
+            self.calls.append((query, settings))
+        if query == "fail":
+            raise Exception("search failed")
+        return f"answer to {query}"
+
+
+def run_batch(tmp_path, lines):
+    batch_file = tmp_path / "queries.jsonl"
+    batch_file.write_text("\n".join(lines) + "\n")
+    ask = StubAsk()
+    output = io.StringIO()
+    run_batch_queries(ask, str(batch_file), make_settings(), output, 2, logger)
+    records = [json.loads(line) for line in output.getvalue().splitlines()]
+    return ask, {record["id"]: record for record in records}
+
+
+def test_run_batch_queries(tmp_path):
+    ask, records = run_batch(
+        tmp_path,
+        [
+            "# a comment",
+            json.dumps({"query": "first"}),
+            "",
+            json.dumps({"query": "second", "id": "q2", "top_k": 3}),
+            json.dumps({"query": "fail"}),
+        ],
+    )
+    assert sorted(records) == ["2", "5", "q2"]
+    assert records["2"]["result"] == "answer to first"
+    assert records["q2"]["result"] == "answer to second"
+    assert records["5"]["error"] == "search failed"
+
+    top_k_by_query = {query: settings.top_k for query, settings in ask.calls}
+    assert top_k_by_query == {"first": 5, "second": 3, "fail": 5}
+
+
+@pytest.mark.parametrize(
+    "line, error",
+    [
+        ('{"query": "first"', "Invalid JSON in line 2"),
+        ('["first"]', "Line 2 of .* is not a JSON object"),
+        ('{"id": "q1"}', "No query found in line 2"),
+        ('{"query": "first", "top": 3}', "Unknown settings top in line 2"),
+    ],
+)
+def test_malformed_line(tmp_path, line, error):
+    with pytest.raises(Exception, match=error):
+        run_batch(tmp_path, [json.dumps({"query": "ok"}), line])
@@ -0,0 +1,92 @@
+import threading
+
+import numpy as np
+import pytest
+from chonkie import Chunk
+
+from ask import corpus_table_name
+from conftest import make_settings
+
+urls = [f"https://example.com/{i}" for i in range(5)]
+
+
+@pytest.fixture
+def corpus_ask(make_ask, ask_env, monkeypatch):
+    monkeypatch.setenv("CORPUS_DB_FILE", str(ask_env / "corpus.duckdb"))
+    ask = make_ask()
+    rng = np.random.default_rng(0)
+    ask.embed_query = lambda query: rng.standard_normal(8).astype(np.float32)
+
+    all_chunks = {
+        url: [
+            Chunk(text=f"duckdb {url} {i}", start_index=0, end_index=0, token_count=0)
+            for i in range(3)
+        ]
+        for url in urls
+    }
+    embeddings_by_key = {
+        ask._embedding_cache_key(chunk.text): rng.standard_normal(8).astype(np.float32)
+        for chunks in all_chunks.values()
+        for chunk in chunks
+    }
+    ask.save_chunks_to_db(all_chunks, embeddings_by_key=embeddings_by_key)
+    return ask
+
+
+@pytest.mark.parametrize("hybrid_search", [False, True])
+def test_compact_corpus_after_search(corpus_ask, hybrid_search):
+    settings = make_settings(hybrid_search=hybrid_search)
+    results = corpus_ask.vector_search(
+        corpus_table_name, "duckdb", settings, urls=urls[1:3]
+    )
+    assert len(results) == 5
+    assert {result["url"] for result in results} <= set(urls[1:3])
+
+    # the first hybrid search loads the full text search extension on the parent
+    # connection, which must not leave a transaction open for the checkpoint
+    corpus_ask.compact_corpus()
+
+
+def test_maybe_compact_corpus_runs_in_background(corpus_ask):
+    compact_threads = []
+
+    def compact_corpus():
+        compact_threads.append(threading.current_thread().name)
+        raise Exception("compaction failed")
+
+    corpus_ask.corpus_compact_interval = 2
+    corpus_ask.compact_corpus = compact_corpus
+    for _ in range(4):
+        # the failed compaction is logged instead of failing the query
+        corpus_ask.maybe_compact_corpus()
+    corpus_ask._compact_executor.shutdown(wait=True)
+    assert len(compact_threads) == 2
+    assert all(name.startswith("compact") for name in compact_threads)
+
+
+def test_vector_search_of_urls_far_from_query(corpus_ask):
+    query_vec = np.ones(8, dtype=np.float32)
+    near_texts = [f"near {i}" for i in range(50)]
+    corpus_ask.save_chunks_to_db(
+        {
+            f"https://near.example.com/{i}": [
+                Chunk(text=text, start_index=0, end_index=0, token_count=0)
+            ]
+            for i, text in enumerate(near_texts)
+        },
+        embeddings_by_key={
+            corpus_ask._embedding_cache_key(text): query_vec for text in near_texts
+        },
+    )
+
+    # the chunks of the URL are not among the nearest chunks of the table
+    results = corpus_ask.vector_search(
+        corpus_table_name, "duckdb", make_settings(), urls=urls[:1], query_vec=query_vec
+    )
+    rows = corpus_ask.db_cursor.execute(
+        f"SELECT chunk, vec FROM {corpus_table_name} WHERE url = ?", [urls[0]]
+    ).fetchall()
+    expected = sorted(
+        rows, key=lambda row: -np.dot(row[1], query_vec) / np.linalg.norm(row[1])
+    )
+    assert [result["chunk"] for result in results] == [row[0] for row in expected]
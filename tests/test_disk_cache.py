@@ -0,0 +1,114 @@
+import json
+import time
+
+import httpx
+import pytest
+
+from ask import DiskCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # one second per call, so that the access times are ordered
+    now = [1000.0]
+
+    def fake_time() -> float:
+        now[0] += 1.0
+        return now[0]
+
+    monkeypatch.setattr(time, "time", fake_time)
+    return now
+
+
+def test_get_and_put(tmp_path):
+    cache = DiskCache(db_path=str(tmp_path / "cache.db"), max_entries=10)
+    assert cache.get("a") is None
+    cache.put_many({"a": b"1", "b": b"2"})
+    assert cache.get_many(["a", "b", "c", "a"]) == {"a": b"1", "b": b"2"}
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    # the values are persisted in the file
+    reopened_cache = DiskCache(db_path=str(tmp_path / "cache.db"), max_entries=10)
+    assert reopened_cache.get("b") == b"2"
+
+
+def test_evicts_the_least_recently_used(tmp_path, clock):
+    cache = DiskCache(db_path=str(tmp_path / "cache.db"), max_entries=10)
+    for i in range(10):
+        cache.put(f"key{i}", b"value")
+    # reading key0 makes key1 the least recently used
+    assert cache.get("key0") == b"value"
+
+    # evicts down to 90% of the limit, i.e., the two least recently used
+    cache.put("key10", b"value")
+    found = cache.get_many([f"key{i}" for i in range(11)])
+    assert sorted(found) == sorted(["key0"] + [f"key{i}" for i in range(3, 11)])
+
+
+def test_no_eviction_under_the_limit(tmp_path, clock):
+    cache = DiskCache(db_path=str(tmp_path / "cache.db"), max_entries=10)
+    cache.put_many({f"key{i}": b"value" for i in range(10)})
+    assert len(cache.get_many([f"key{i}" for i in range(10)])) == 10
+
+
+class StubHttpClient:
+    def __init__(self, response: httpx.Response):
+        self.response = response
+        self.requests = []
+
+    def get(self, url, headers=None, polite=True) -> httpx.Response:
+        self.requests.append((url, headers))
+        return self.response
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def cached_page_ask(make_ask, monkeypatch):
+    monkeypatch.setenv("SCRAPE_CACHE_TTL", "60")
+    ask = make_ask()
+    ask.scrape_cache.put(
+        "https://example.com",
+        json.dumps(
+            {
+                "body_text": "cached text",
+                "etag": '"v1"',
+                "last_modified": None,
+                "fetched_at": time.time(),
+            }
+        ).encode("utf-8"),
+    )
+    ask.http_client.close()
+    return ask
+
+
+def test_fresh_cached_page_is_used(cached_page_ask):
+    cached_page_ask.http_client = StubHttpClient(httpx.Response(500))
+    url, body_text, response = cached_page_ask._fetch_url("https://example.com")
+    assert (body_text, response) == ("cached text", None)
+    assert cached_page_ask.http_client.requests == []
+
+
+def test_expired_cached_page_is_revalidated(cached_page_ask, monkeypatch):
+    expired_time = time.time() + 120
+    monkeypatch.setattr(time, "time", lambda: expired_time)
+    cached_page_ask.http_client = StubHttpClient(httpx.Response(304))
+    url, body_text, response = cached_page_ask._fetch_url("https://example.com")
+    assert (body_text, response) == ("cached text", None)
+    assert cached_page_ask.http_client.requests == [
+        ("https://example.com", {"If-None-Match": '"v1"'})
+    ]
+
+    # the revalidated page is fresh again
+    cached_page = cached_page_ask._get_cached_page("https://example.com")
+    assert cached_page["fetched_at"] == expired_time
+
+
+def test_expired_cached_page_is_fetched_again(cached_page_ask, monkeypatch):
+    monkeypatch.setattr(time, "time", lambda: 10**10)
+    response = httpx.Response(200, content=b"<html><body>new</body></html>")
+    cached_page_ask.http_client = StubHttpClient(response)
+    url, body_text, fetched_response = cached_page_ask._fetch_url("https://example.com")
+    assert body_text is None
+    assert fetched_response is response
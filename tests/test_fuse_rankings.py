@@ -0,0 +1,49 @@
+import numpy as np
+
+from ask import _fuse_rankings
+
+# the vector search ranks 1, 2, 3 and the full text search ranks 3, 4
+ranked_ids = [np.array([1, 2, 3]), np.array([3, 4])]
+ranked_scores = [np.array([0.9, 0.5, 0.1]), np.array([10.0, 9.0])]
+
+
+def test_rrf_ranks_ids_found_by_both_first():
+    fused = _fuse_rankings(ranked_ids, ranked_scores, [1.0, 1.0], "rrf")
+    # 2 and 4 have the same rank in their lists and 2 appears first
+    assert fused.tolist() == [3, 1, 2, 4]
+
+
+def test_rrf_ignores_scores():
+    other_scores = [np.array([0.1, 0.1, 0.1]), np.array([1.0, 0.0])]
+    assert np.array_equal(
+        _fuse_rankings(ranked_ids, ranked_scores, [1.0, 1.0], "rrf"),
+        _fuse_rankings(ranked_ids, other_scores, [1.0, 1.0], "rrf"),
+    )
+
+
+def test_weighted_uses_normalized_scores():
+    # 1: 0.7, 2: 0.35, 3: 0.0 + 0.3, 4: 0.0
+    fused = _fuse_rankings(ranked_ids, ranked_scores, [0.7, 0.3], "weighted")
+    assert fused.tolist() == [1, 2, 3, 4]
+
+
+def test_weighted_follows_the_weights():
+    fused = _fuse_rankings(ranked_ids, ranked_scores, [0.3, 0.7], "weighted")
+    assert fused.tolist() == [3, 1, 2, 4]
+
+
+def test_weighted_equal_scores_get_the_full_weight():
+    fused = _fuse_rankings(
+        [np.array([5, 6]), np.array([6])],
+        [np.array([0.5, 0.5]), np.array([2.0])],
+        [0.5, 0.5],
+        "weighted",
+    )
+    assert fused.tolist() == [6, 5]
+
+
+def test_empty_lists():
+    assert _fuse_rankings([], [], [], "rrf").tolist() == []
+    empty = np.array([], dtype=np.int64)
+    fused = _fuse_rankings([empty, empty], [empty, empty], [0.5, 0.5], "weighted")
+    assert fused.tolist() == []
@@ -0,0 +1,77 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ask import SingleFlight
+
+
+def test_claim_returns_the_unclaimed_keys():
+    flight = SingleFlight()
+    own_keys, shared_futures = flight.claim(["a", "b", "a"])
+    assert own_keys == ["a", "b"]
+    assert shared_futures == {}
+
+    own_keys, shared_futures = flight.claim(["b", "c"])
+    assert own_keys == ["c"]
+    assert list(shared_futures) == ["b"]
+
+
+def test_waiter_receives_the_result():
+    flight = SingleFlight()
+    flight.claim(["a"])
+    _, shared_futures = flight.claim(["a"])
+    flight.resolve("a", "page text")
+    assert shared_futures["a"].result(timeout=1) == "page text"
+
+    # a resolved key can be claimed again
+    own_keys, _ = flight.claim(["a"])
+    assert own_keys == ["a"]
+
+
+def test_waiter_receives_the_exception():
+    flight = SingleFlight()
+    flight.claim(["a"])
+    _, shared_futures = flight.claim(["a"])
+    flight.fail("a", ValueError("embedding failed"))
+    with pytest.raises(ValueError, match="embedding failed"):
+        shared_futures["a"].result(timeout=1)
+
+    own_keys, _ = flight.claim(["a"])
+    assert own_keys == ["a"]
+
+
+def test_fail_after_resolve_is_ignored():
+    # the callers fail all their claimed keys in a finally block
+    flight = SingleFlight()
+    flight.claim(["a"])
+    _, shared_futures = flight.claim(["a"])
+    flight.resolve("a", 1)
+    flight.fail("a", ValueError("too late"))
+    assert shared_futures["a"].result(timeout=1) == 1
+
+
+def test_concurrent_callers_do_the_work_once():
+    flight = SingleFlight()
+    work_count = 0
+    work_lock = threading.Lock()
+    start = threading.Barrier(8)
+
+    def scrape(url: str) -> str:
+        nonlocal work_count
+        start.wait()
+        own_keys, shared_futures = flight.claim([url])
+        if len(own_keys) == 0:
+            return shared_futures[url].result(timeout=5)
+        with work_lock:
+            work_count += 1
+        # let the other callers claim the key before it is resolved
+        time.sleep(0.1)
+        flight.resolve(url, f"text of {url}")
+        return f"text of {url}"
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(scrape, ["https://example.com"] * 8))
+    assert results == ["text of https://example.com"] * 8
+    assert work_count == 1
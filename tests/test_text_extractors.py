@@ -0,0 +1,81 @@
+import os
+
+import pytest
+
+from ask import LxmlTextExtractor, _extract_page_text, text_extractors
+
+fixture_dir = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "scripts",
+    "fixtures",
+    "html",
+)
+
+# the main content kept by all the extractors and the boilerplate dropped by lxml
+fixtures = {
+    "blog_post.html": (
+        "The total runtime dropped from forty minutes to six minutes.",
+        ["Related posts", "2024 Example Corp", "enable JavaScript", "fetch("],
+    ),
+    "news_article.html": (
+        "would cut average commute times by eighteen minutes",
+        ["Politics", "Most read", "All rights reserved", "querySelectorAll"],
+    ),
+    "wiki_page.html": (
+        "Hybrid approaches often use reciprocal rank fusion to combine the ranked",
+        ["Random article", "last edited", "createElement"],
+    ),
+}
+
+
+def read_fixture(file_name: str) -> bytes:
+    with open(os.path.join(fixture_dir, file_name), "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("extractor_name", sorted(text_extractors))
+@pytest.mark.parametrize("file_name", sorted(fixtures))
+def test_extract_main_content(extractor_name, file_name):
+    main_text, _ = fixtures[file_name]
+    body_text = text_extractors[extractor_name]().extract(read_fixture(file_name))
+    assert main_text in body_text
+    assert "  " not in body_text
+    assert "<" not in body_text
+
+
+@pytest.mark.parametrize("file_name", sorted(fixtures))
+def test_lxml_drops_boilerplate(file_name):
+    _, boilerplate = fixtures[file_name]
+    body_text = LxmlTextExtractor().extract(read_fixture(file_name))
+    for text in boilerplate:
+        assert text not in body_text
+
+
+def test_lxml_separates_block_tags():
+    body_text = LxmlTextExtractor().extract(read_fixture("wiki_page.html"))
+    assert "Hybrid search Combines both Requires score fusion" in body_text
+
+
+def test_lxml_keeps_nested_page_region_tags():
+    # the header of the blog post is inside a div, so it is not page boilerplate
+    body_text = LxmlTextExtractor().extract(read_fixture("blog_post.html"))
+    assert body_text.startswith("engineering blog Why we moved our batch jobs")
+
+
+def test_extract_without_body():
+    content = b"<html><head><title>No body</title></head></html>"
+    for extractor_class in text_extractors.values():
+        assert extractor_class().extract(content) is None
+
+
+def test_extract_page_text_falls_back_to_bs4(monkeypatch):
+    def fail(self, content):
+        raise ValueError("broken page")
+
+    monkeypatch.setattr(LxmlTextExtractor, "extract", fail)
+    body_text, cpu_seconds, error = _extract_page_text(
+        "lxml", read_fixture("wiki_page.html")
+    )
+    assert "reciprocal rank fusion" in body_text
+    assert cpu_seconds >= 0
+    assert error == "broken page"